@@ -18,6 +18,11 @@ if sys.version_info[0] > 2:
 else:
     _unicode = unicode
 
+# the size of the blocks read when calculating file checksums; OpenSSL-backed
+# hashlib digests are fastest when fed large blocks, so this is larger than
+# the LOC bagit default.
+HASH_BLOCK_SIZE = 1 << 20
+
 class Path(object):
     """
     A container class for pointing to a path within a specific FS instance
@@ -6,7 +6,7 @@ class which can read serialized versions of bags.
 """
 from __future__ import absolute_import
 import os, sys, re, shutil, codecs, inspect
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, namedtuple, deque
 from abc import ABCMeta, abstractmethod
 from datetime import datetime, tzinfo
 
@@ -14,7 +14,7 @@ from .bagit import Bag, ReadOnlyBag
 from bagit import _parse_tags
 
 from fs.copy import copy_file
-from fs.errors import ResourceNotFound
+from fs.errors import ResourceNotFound, NoSysPath
 from fs import open_fs
 
 if sys.version_info[0] > 2:
@@ -24,10 +24,86 @@ else:
     _unicode = unicode
     from funcsigs import Signature, Parameter
 
+_scandir = getattr(os, 'scandir', None)
+
 _bagsepre = re.compile(r'/')
 _ossepre = re.compile(os.sep)
 
+# the names of the special files defined by the BagIt standard
+_special_files = frozenset("bagit.txt bag-info.txt fetch.txt".split())
+_special_re = re.compile(r"^(tag)?manifest-(\w+)\.txt$")
+
 FileTimes = namedtuple('FileTimes', "ctime mtime atime".split())
+
+def _scandir_contents(rootdir, breadth=False, follow_links=False):
+    # iterate through (path, size, isdir) tuples for all of the files and 
+    # empty directories below rootdir on local disk, walking depth-first
+    # like os.walk() or, if breadth is True, breadth-first like fs.walk.
+    # Linked directories are descended into only if follow_links is True.
+    # os.scandir gets a file's type and size in the fewest system calls.
+    dirs = deque([(rootdir, '')])
+    while dirs:
+        sysdir, reldir = dirs.popleft() if breadth else dirs.pop()
+        subdirs = []
+        empty = True
+        for entry in _scandir(sysdir):
+            empty = False
+            if entry.is_dir():
+                if follow_links or not entry.is_symlink():
+                    subdirs.append((entry.path, reldir + entry.name + '/'))
+            else:
+                yield reldir + entry.name, entry.stat().st_size, False
+        if empty and reldir:
+            yield reldir.rstrip('/'), 0, True
+        dirs.extend(subdirs if breadth else reversed(subdirs))
+
+def _fwalk_contents(rootdir, breadth=False, follow_links=False):
+    # like _scandir_contents(), but via os.fwalk() which keeps the directory
+    # being listed open so that each file is stat-ed relative to it (i.e. 
+    # with fstatat) rather than by resolving its full path again.
+    groups = []
+    witer = os.fwalk(rootdir, follow_symlinks=follow_links)
+    for dirpath, subdirs, files, dirfd in witer:
+        reldir = _ossepre.sub('/', dirpath[len(rootdir):].strip(os.sep))
+        depth = reldir and reldir.count('/') + 1 or 0
+        if not subdirs and not files:
+            if reldir:
+                groups.append((depth, [(reldir, 0, True)]))
+            continue
+        prefix = reldir and reldir+'/'
+        groups.append((depth,
+                       [(prefix + f, os.stat(f, dir_fd=dirfd).st_size, False)
+                        for f in files]))
+
+    if breadth:
+        # os.fwalk() goes depth-first; a stable sort on the depth gives the
+        # breadth-first order
+        groups.sort(key=lambda g: g[0])
+    for depth, entries in groups:
+        for entry in entries:
+            yield entry
+
+def _local_contents(rootdir, breadth=False, follow_links=False):
+    # iterate through (path, size, isdir) tuples for the files and empty 
+    # directories below rootdir on local disk using the fastest means 
+    # available on this platform
+    if hasattr(os, 'fwalk') and os.stat in os.supports_dir_fd:
+        return _fwalk_contents(rootdir, breadth, follow_links)
+    return _scandir_contents(rootdir, breadth, follow_links)
+
+def _nonstandard(listing):
+    # iterate through the paths in a walk_all() listing, skipping the special
+    # files defined by the BagIt standard
+    for path, size, isdir in listing:
+        if isdir:
+            # spit out a directory if it is empty
+            yield path
+            continue
+        # don't spit out a file is it's one of the special ones
+        file = path.rpartition('/')[2]
+        if file not in _special_files and not _special_re.match(file):
+            yield path
+
 def _d2e(dt):
     if not isinstance(dt, datetime):
         return dt
@@ -150,6 +226,17 @@ class ExtendedReadMixin(object):
         """
         raise NotImplementedError()
 
+    @abstractmethod
+    def open_bin_file(self, path):
+        """
+        return a open, read-only binary file object on the file from the 
+        source bag with the given path.
+
+        :param str path:     the path to the file to open, relative to the source
+                             bag's root directory.
+        """
+        raise NotImplementedError()
+
     def nonstandard(self):
         """
         iterate through the non-standard files in this bag.  This will 
@@ -158,18 +245,28 @@ class ExtendedReadMixin(object):
         any directory in the bag that is empty (to allow it to be replicated
         in output multibags).
         """
-        special = [re.compile(r) for r in
-                       r"^bagit.txt$ ^bag-info.txt$ ^fetch.txt$".split() +
-                       r"^(tag)?manifest-(\w+).txt$".split()]
+        return _nonstandard(self.walk_all())
 
+    def walk_all(self):
+        """
+        return a listing of all of the files and empty directories in this 
+        bag as a list of (path, size, isdir) tuples, where path is relative
+        to the bag's base directory and delimited by forward slashes ('/').  
+        The size of a directory is given as 0.  The listing is gathered in a 
+        single pass over the bag each time this is called.  
+        """
+        return list(self._walk_contents())
+
+    def _walk_contents(self):
+        # iterate through (path, size, isdir) tuples for walk_all().  
+        # Subclasses should override this to gather the sizes as part of the 
+        # walk.
         for dir, subdirs, files in self.walk():
             if len(subdirs) == 0 and len(files) == 0:
-                # spit out a directory if it is empty
-                yield dir
+                yield dir, 0, True
             for file in files:
-                # don't spit out a file is it's one of the special ones
-                if not any([bool(spf.match(file)) for spf in special]):
-                    yield os.path.join(dir, file)
+                path = "/".join([dir, file]) if dir else file
+                yield path, self.sizeof(path), False
 
     def _load_bag_info(self):
         # this (re-)reads the bag-info data, loading it into an OrderedDict
@@ -387,6 +484,17 @@ class _ExtendedReadWritableMixin(ExtendedReadMixin):
         """
         path = self._canon_path(path)
         return codecs.open(path, encoding=encoding);
+
+    def open_bin_file(self, path):
+        """
+        return a open, read-only binary file object on the file from the 
+        source bag with the given path.
+
+        :param str path:     the path to the file to open, relative to the source
+                             bag's root directory.
+        """
+        path = self._canon_path(path)
+        return open(path, 'rb')
         
     def walk(self, start=None):
         """
@@ -423,6 +531,13 @@ class _ExtendedReadWritableMixin(ExtendedReadMixin):
             
             yield dir, subdirs, files
 
+    def _walk_contents(self):
+        # iterate through (path, size, isdir) tuples for walk_all(), in the 
+        # same order as walk()
+        if not _scandir:
+            return super(_ExtendedReadWritableMixin, self)._walk_contents()
+        return _local_contents(self._bagdir)
+
     def calc_oxum(self):
         """
         calculate and return the Bagit-defined Payload-Oxum as a 2-tuple for 
@@ -652,6 +767,16 @@ class _ExtendedReadOnlyMixin(ExtendedReadMixin):
         """
         return self._root.fs.open(path, encoding=encoding)
 
+    def open_bin_file(self, path):
+        """
+        return a open, read-only binary file object on the file from the 
+        source bag with the given path.
+
+        :param str path:     the path to the file to open, relative to the source
+                             bag's root directory.
+        """
+        return self._root.fs.openbin(path)
+
     def walk(self, start=None):
         """
         Walk the source bag contents returning the triplets returned by
@@ -688,6 +813,30 @@ class _ExtendedReadOnlyMixin(ExtendedReadMixin):
             except StopIteration:  # see PEP0479 for supporting 3.7+
                 return
 
+    def _walk_contents(self):
+        # iterate through (path, size, isdir) tuples for walk_all(), in the 
+        # same order as walk(), getting the file sizes as part of the walk
+        if _scandir:
+            # a bag that is a directory on local disk can be walked directly
+            # (following links, as the fs walk does)
+            try:
+                rootdir = self._root.fs.getsyspath(self._root.path or u'/')
+                return _local_contents(rootdir, True, True)
+            except NoSysPath:
+                pass
+        return self._walk_fs_contents()
+
+    def _walk_fs_contents(self):
+        # walk_all() contents via the bag's filesystem (e.g. a serialized bag)
+        witer = self._root.fs.walk.walk(namespaces=['details'])
+        for base, dirs, files in witer:
+            base = base.strip('/')
+            if not dirs and not files:
+                yield base, 0, True
+            prefix = base and base+'/'
+            for f in files:
+                yield prefix + f.name, f.size, False
+
 class ExtendedReadOnlyBag(ReadOnlyBag, _ExtendedReadOnlyMixin):
     """
     A ReadOnlyBag (which may be serialized) with an extended interface.
@@ -2,19 +2,21 @@
 Tools for splitting a single bag (a ProgenitorBag) into a set of 
 Multibag-compliant bags.
 """
-import os, sys, re, shutil, io
+import os, sys, re, shutil, io, codecs, errno
 from abc import ABCMeta, abstractmethod
-from collections import OrderedDict
-from copy import deepcopy
-from functools import cmp_to_key
+from collections import OrderedDict, deque
+from bisect import bisect_left
+from itertools import islice
 
 from .constants import CURRENT_VERSION as MBAG_VERSION, DEF_ENC
 from .access.bagit import Bag, ReadOnlyBag
 from .access.multibag import as_headbag, MissingMultibagFileError
 from .access.extended import as_extended, ExtendedReadMixin as ProgenitorMixin
+from .access.extended import _nonstandard
 from bagit import _parse_tags
 
 from fs.copy import copy_file
+from fs.errors import NoSysPath
 from fs import open_fs
 
 _bagsepre = re.compile(r'/')
@@ -34,6 +36,52 @@ if sys.version_info[0] > 2:
 else:
     _unicode = unicode
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2.7 without the futures backport
+    ThreadPoolExecutor = None
+
+def _local_bag_dir(bag):
+    # return the path to the given bag's root directory on local disk or 
+    # None if the bag is not available as a local directory (e.g. it is 
+    # serialized)
+    root = getattr(bag, '_bagdir', None)
+    if root is None and hasattr(bag, '_root'):
+        try:
+            root = bag._root.fs.getsyspath(bag._root.path or u'/')
+        except NoSysPath:
+            pass
+    return root
+
+def _write_item(lines, key, vals):
+    # append the bag-info tag lines for the given values to a list of lines
+    if isinstance(vals, list):
+        lines.extend([u"%s: %s\n" % (key, v) for v in vals])
+    else:
+        lines.append(u"%s: %s\n" % (key, vals))
+
+class _ManifestList(list):
+    # the list of a SplitPlan's manifests; it calls the given function 
+    # whenever manifests are added, removed, or replaced so that the plan
+    # can drop information derived from them.
+    def __init__(self, onchange):
+        super(_ManifestList, self).__init__()
+        self._onchange = onchange
+
+def _notifies(name):
+    listmeth = getattr(list, name)
+    def method(self, *args):
+        self._onchange()
+        return listmeth(self, *args)
+    method.__name__ = name
+    return method
+
+for _name in "append extend insert pop remove clear reverse sort __setitem__ " \
+             "__delitem__ __iadd__ __imul__ __setslice__ __delslice__".split():
+    if hasattr(list, _name):
+        setattr(_ManifestList, _name, _notifies(_name))
+
 def asProgenitor(bag):
     """
     extend the interface on an open Bag instance so that it can be used as 
@@ -74,21 +122,25 @@ class SplitPlan(object):
         if not isinstance(source, ProgenitorMixin):
             source = asProgenitor(source)
         self.progenitor = source
-        self._manifests = []
+        self._manifests = _ManifestList(self._manifests_changed)
+        self._destindex = None
+        self._listing = None   # the progenitor's walk_all() while planning
         self.head_version = "1"
         self._deprecates = []
 
     def manifests(self):
         """
         return an iterator for iterating over the manifest descriptions that 
-        prescribe the contents of each output multibag.
+        prescribe the contents of each output multibag.  Each description is
+        a shallow copy of the one held by the plan; thus, the lists it 
+        contains should not be altered.
         """
         if len(self._manifests) == 0:
             return
         
         i = 0
         while i < len(self._manifests):
-            out = deepcopy(self._manifests[i])
+            out = dict(self._manifests[i])
             out['ishead'] = (i == len(self._manifests)-1)
             yield out
             i += 1
@@ -111,9 +163,9 @@ class SplitPlan(object):
         plan (i.e. any of the output multibags).  A directory is included in 
         the list only if it appears in the source bag as an empty directory.  
         """
+        index = self._destination_index()
         for file in self.required():
-            outbag = self.find_destination(file)
-            if not outbag:
+            if file not in index:
                 yield file
 
     def required(self):
@@ -123,11 +175,28 @@ class SplitPlan(object):
         plan.  A directory is included in the list only if it appears in the 
         source bag as an empty directory.  
         """
+        if self._listing is not None:
+            return _nonstandard(self._listing)
         return self.progenitor.nonstandard()
 
-    def _path_in(self, path, manifest):
-        # return true if the path can be found in the given plan manifest
-        return path in manifest['contents']
+    def _destination_index(self):
+        # return a dictionary mapping each path in the plan to the last 
+        # manifest that contains it.  It is built once and kept until the 
+        # manifests change.
+        if self._destindex is None:
+            index = {}
+            for m in self._manifests:
+                for path in m['contents']:
+                    index[path] = m
+            self._destindex = index
+        return self._destindex
+
+    def _manifests_changed(self):
+        # drop the destination index.  This is called automatically when 
+        # manifests are added to or removed from self._manifests; it must be
+        # called explicitly after editing the contents of a manifest that is
+        # already part of the plan.
+        self._destindex = None
 
     def find_destination(self, path):
         """
@@ -137,10 +206,7 @@ class SplitPlan(object):
         None is returned.  If the path is listed for more than one output
         bag, the last one it appears in will be returned.  
         """
-        for m in reversed(self._manifests):
-            if self._path_in(path, m):
-                return m
-        return None
+        return self._destination_index().get(path)
 
     def name_output_bags(self, naming_iter, reverse=False):
         """
@@ -154,17 +220,20 @@ class SplitPlan(object):
                                    the manifests in reverse order (i.e. with
                                    the head bag getting the first name in 
                                    the sequence).  
+        :raises RuntimeError:  if the iterator runs out of names before all
+                                   manifests are named; in this case, none 
+                                   of the manifest names are changed.
         """
+        names = list(islice(naming_iter, len(self._manifests)))
+        if len(names) < len(self._manifests):
+            after = (names and (" (after %s)" % names[-1])) or ""
+            raise RuntimeError("Naming iterator exhausted prematurely"+after)
+
         use = self._manifests
         if reverse:
             use = reversed(use)
-        try:
-            for m in use:
-                name = next(naming_iter)
-                self._set_manifest_name(m, name)
-        except StopIteration as ex:
-            after = (name and (" (after %s)" % name)) or ""
-            raise RuntimeError("Naming iterator exhausted prematurely"+after)
+        for m, name in zip(use, names):
+            self._set_manifest_name(m, name)
 
     def _set_manifest_name(self, manifest, name):
         manifest['name'] = name
@@ -187,10 +256,13 @@ class SplitPlan(object):
                                           len(self._manifests)),
             "contents": list(self.missing())
         }
-        size = 0
-        for f in man['contents']:
-            size += self.progenitor.sizeof(f)
-        man['totalsize'] = size
+        # while planning, take the sizes from the progenitor's listing
+        sizes = {}
+        if self._listing is not None:
+            sizes = dict((p, sz) for p, sz, isdir in self._listing)
+        man['sizes'] = [sizes[f] if f in sizes else self.progenitor.sizeof(f)
+                        for f in man['contents']]
+        man['totalsize'] = sum(man['sizes'])
         if man['contents']:
             self._manifests.append(man)
 
@@ -224,24 +296,94 @@ class SplitPlan(object):
                 member bag and returns its output path.  StopIteration
                 is raised when there are no more output bags to write.
         """
-        if not self.manifests:
+        return self._apply(outdir, naming_iter, info_nopass, logger, 1)
+
+    def apply(self, outdir, info_nopass=None, logger=None, max_workers=None):
+        """
+        apply the plan by writing all of the split bags to a given directory.
+        Unlike apply_iter(), this method may write the member bags other than 
+        the head bag concurrently using a pool of threads; the head bag is 
+        written last.  Bags are only written concurrently when the source bag
+        is a directory on local disk, as the handles on serialized bags cannot
+        be shared between threads.  Each member bag is given the name 
+        currently set in its manifest (see name_output_bags()).  
+
+        :param str outdir: the directory to write the split bags to.  
+        :param info_nopass:  a list of bag-info metadata names from the source
+                           bag that should not be passed to the split bags.
+                           If None, all names will be transfered to the output
+                           multibags; values for some standard names will be 
+                           transformed appropriately.
+        :type  info_nopass:  list of str
+        :param Logger logger: a logger instance to send messages to.
+        :param int max_workers:  the maximum number of threads to use to 
+                           write member bags.  If None, up to 8 threads are 
+                           used; a value of 1 writes the bags one at a time.
+        :rtype: a list of str, the paths to the output bags in plan order
+        """
+        return list(self._apply(outdir, None, info_nopass, logger, max_workers))
+
+    def _apply(self, outdir, naming_iter, info_nopass, logger, max_workers):
+        # the implementation behind apply_iter() and apply():  iterate through
+        # the plan's manifests, writing each output bag and yielding its path.
+        # The bags other than the head bag are written by a pool of up to
+        # max_workers threads (None means up to 8) when this is possible;
+        # the head bag is always written last.
+        manifests = list(self.manifests())
+        if not manifests:
             if logger:
                 logger.warn("Requested plan execution, but no manifests are set")
             raise RuntimeError("No manifests set for output bags")
 
+        filedest, memberbags, srcdata = self._prep_apply()
+
+        names = [m.get('name') for m in manifests]
+        if naming_iter:
+            for i, m in enumerate(manifests):
+                try:
+                    names[i] = next(naming_iter)
+                except StopIteration as ex:
+                    if logger and not m.get('ishead'):
+                        logger.warn("naming iterator ran out of names before "+
+                                    "output bags")
+                    break
+        for bagname in names:
+            if bagname in memberbags:
+                memberbags.remove(bagname)
+            memberbags.append(bagname)
+        bagdirs = [os.path.join(outdir, n) for n in names]
+
+        # write the non-head bags
+        jobs = [(m, n, d, info_nopass, srcdata, logger)
+                for m, n, d in zip(manifests[:-1], names[:-1], bagdirs[:-1])]
+        if max_workers is None:
+            max_workers = min(8, len(jobs))
+        if ThreadPoolExecutor is None or max_workers < 2 or len(jobs) < 2 or \
+           not _local_bag_dir(self.progenitor):
+            for job in jobs:
+                filedest.update(self._write_bag(*job))
+                yield job[2]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(self._write_bag, *job) for job in jobs]
+                # merge the file destinations in plan order
+                for job, f in zip(jobs, futures):
+                    filedest.update(f.result())
+                    yield job[2]
+
+        # now write the head bag
+        filedest.update(self._write_bag(manifests[-1], names[-1], bagdirs[-1],
+                                        info_nopass, srcdata, logger))
+        self._write_multibag_files(bagdirs[-1], memberbags, filedest)
+        yield bagdirs[-1]
+
+    def _prep_apply(self):
+        # set up for writing output bags, returning the initial file lookup 
+        # map, the initial member bag list, and a snapshot of the progenitor
+        # data that every output bag needs (see _write_bag())
         if hasattr(self.progenitor, 'replicate_with_hardlink'):
             self.progenitor.replicate_with_hardlink = True
 
-        if not info_nopass:
-            info_nopass = []
-
-        def _write_item(fd, key, vals):
-            if not isinstance(vals, list):
-                vals = [vals]
-            for v in vals:
-                fd.write(u"%s: %s\n" % (key,v))
-            
-
         # multibag tag info; initialize from the progenitor bag if the
         # progenitor is a head bag itself
         filedest = OrderedDict()
@@ -256,162 +398,296 @@ class SplitPlan(object):
                 filedest = OrderedDict(self.progenitor.iter_file_lookup())
             except MissingMultibagFileError:
                 pass
-        
-        for m in self.manifests():
-            bagname = m.get('name')
-            if naming_iter:
-                try:
-                    bagname = naming_iter.next()
-                except StopIteration as ex:
-                    if logger and not m.get('ishead'):
-                        logger.warn("naming iterator ran out of names before "+
-                                    "output bags")
-                    naming_iter = None
-            if bagname in memberbags:
-                memberbags.remove(bagname)
-            memberbags.append(bagname)
 
-            # create the bag directory and its data subdirectory
-            bagdir = os.path.join(outdir, bagname)
-            os.mkdir(bagdir)
-            os.mkdir(os.path.join(bagdir,"data"))
+        # these get built from scratch with each call (re-reading the 
+        # manifests and bag-info.txt), so fetch them just once
+        srcdata = (self.progenitor.payload_entries(),
+                   self.progenitor.tagfile_entries(),
+                   list(self.progenitor.info.items()),
+                   [os.path.basename(mf)
+                    for mf in self.progenitor.manifest_files()])
+
+        return filedest, memberbags, srcdata
+
+    def _write_bag(self, m, bagname, bagdir, info_nopass, srcdata, logger=None):
+        # write a single output bag, bagdir, as described by the given plan
+        # manifest, m.  srcdata is the tuple returned by _prep_apply():  the
+        # progenitor's payload and tag file manifest entries, its bag-info 
+        # items, and the names of its payload manifest files.  An OrderedDict
+        # mapping the files written to the bag's name is returned.
+        if not info_nopass:
+            info_nopass = []
+        payload_hashes, tag_hashes, srcinfo, manifest_names = srcdata
+        data_prefix = "data" + os.sep
+        filedest = OrderedDict()
+
+        made_dirs = set()
+        def _ensure_dir(path):
+            # create the directory (and its parents) unless we already have;
+            # return True if the directory was not previously known to exist
+            if path in made_dirs:
+                return False
+            try:
+                os.makedirs(path)
+            except OSError as ex:
+                if ex.errno != errno.EEXIST or not os.path.isdir(path):
+                    raise
+            made_dirs.add(path)
+            return True
+
+        # create the bag directory and its data subdirectory
+        os.mkdir(bagdir)
+        os.mkdir(os.path.join(bagdir,"data"))
+        made_dirs.update([bagdir, os.path.join(bagdir,"data")])
 
-            # create empty manifest files
-            for mf in self.progenitor.manifest_files():
-                mfp = os.path.join(bagdir, os.path.basename(mf))
-                with io.open(mfp, 'w', encoding=DEF_ENC) as fd:
-                    pass
+        self.progenitor.replicate("bagit.txt", bagdir)
 
-            self.progenitor.replicate("bagit.txt", bagdir)
+        # if the progenitor is on local disk, we can replicate files directly
+        srcdir = _local_bag_dir(self.progenitor)
+        hardlink = getattr(self.progenitor, 'replicate_with_hardlink', False)
 
-            payload_count = 0
-            payload_size = 0
-            for file in m['contents']:
+        payload_count = 0
+        payload_size = 0
 
-                if not self.progenitor.exists(file):
-                    if logger:
-                        logger.warn("Plan for %s calls for non-existent file, %s",
-                                    bagname, file)
-                    continue
+        # collect manifest entries by manifest file name; each of the
+        # progenitor's payload manifests is written even if empty
+        manbuf = OrderedDict((mf, []) for mf in manifest_names)
 
-                opath = os.path.join(bagdir, file)
-                if self.progenitor.isdir(file):
-                    if not os.path.exists(opath):
-                        if logger:
-                            logger.info("Creating (empty) directory, %s", file)
-                        os.makedirs(os.path.join(bagdir, file))
+        # use the file sizes recorded in the plan, if available
+        contents = m['contents']
+        sizes = m.get('sizes')
+        if sizes is None or len(sizes) != len(contents):
+            sizes = [None] * len(contents)
+        for file, fsize in zip(contents, sizes):
 
-                else:
-                    if logger:
-                        logger.info("Replicating file, %s", file)
+            if not self.progenitor.exists(file):
+                if logger:
+                    logger.warn("Plan for %s calls for non-existent file, %s",
+                                bagname, file)
+                continue
+
+            opath = os.path.join(bagdir, file)
+            if self.progenitor.isdir(file):
+                if _ensure_dir(opath) and logger:
+                    logger.info("Created (empty) directory, %s", file)
 
-                    # copy the file to the output bag
-                    parent = os.path.dirname(opath)
-                    if not os.path.exists(parent):
-                        os.makedirs(parent)
+            else:
+                if logger:
+                    logger.info("Replicating file, %s", file)
+
+                # copy the file to the output bag
+                _ensure_dir(os.path.dirname(opath))
+                if srcdir:
+                    try:
+                        self._replicate_local(os.path.join(srcdir, file),
+                                              opath, hardlink)
+                    except (IOError, OSError) as ex:
+                        raise RuntimeError("Failed to replicate file in "+
+                                           "output bag, "+bagname+": "+file+
+                                           ": "+str(ex))
+                else:
                     self.progenitor.replicate(file, bagdir)
-                    if not os.path.isfile(os.path.join(bagdir,file)):
-                        raise RuntimeError("Failed to replicate file in output "+
-                                           "bag, "+bagname+": "+file)
-
-                    # copy its hash, if it has one recorded
-                    if file.startswith("data"+os.sep):
-                        payload_count += 1
-                        payload_size += \
-                                os.stat(os.path.join(bagdir,file)).st_size
-                        hd = self.progenitor.payload_entries()
-                        mantype = PMAN
-                    else:
-                        hd = self.progenitor.tagfile_entries()
-                        mantype = TMAN
-                    if file in hd:
-                        hashes = hd[file]
-                        for alg in hashes:
-                            self._record_hash(bagdir, alg, hashes[alg],
-                                              file, mantype)
-                        
-                    filedest[file] = bagname
-                    
-            # create the bag-info file
-            outinfo = os.path.join(bagdir, "bag-info.txt")
-            with io.open(outinfo, 'w', encoding=DEF_ENC) as fd:
-                _write_item(fd, 'Multibag-Version', MBAG_VERSION)
-                for name, vals in self.progenitor.info.items():
-                    if name.startswith('Multibag-'):
-                        continue
-                    if name in info_nopass:
-                        continue
+                    if not os.path.isfile(opath):
+                        raise RuntimeError("Failed to replicate file in "+
+                                           "output bag, "+bagname+": "+file)
+
+                # copy its hash, if it has one recorded
+                if file.startswith(data_prefix):
+                    payload_count += 1
+                    if fsize is None:
+                        fsize = self.progenitor.sizeof(file)
+                    payload_size += fsize
+                    hd = payload_hashes
+                    mantype = PMAN
+                else:
+                    hd = tag_hashes
+                    mantype = TMAN
+                if file in hd:
+                    fhashes = hd[file]
+                    for alg in fhashes:
+                        manfile = "%s-%s.txt" % (mantype, alg)
+                        manbuf.setdefault(manfile, []).append(
+                            u"%s %s\n" % (fhashes[alg], file))
                     
-                    if not isinstance(vals, list):
-                        vals = [vals]
-                    if name == 'Internal-Sender-Identifier':
-                        _write_item(fd, name, bagname)
-                        name = 'Multibag-Source-'+name
-                    elif name == 'Internal-Sender-Description':
-                        _write_item(fd, name, m.get(name,
-                                                    MBAG_INTERNAL_SENDER_DESC))
-                        name = 'Multibag-Source-'+name
-                    elif name == 'External-Identifier':
-                        _write_item(fd, 'Multibag-Source-'+name, vals)
-                        _write_item(fd, name, vals[0]+'/mbag:'+bagname)
-                        name = 'Bag-Group-Identifier'
-                    elif name == 'Bag-Size':
-                        name = 'Multibag-Source-'+name
-                    elif name == 'Payload-Oxum':
-                        vals = ["%s.%s" % (payload_size, payload_count)]
-
-                    _write_item(fd, name, vals)
-
-                _write_item(fd, "Multibag-Tag-Directory", "multibag")
-                if m.get('ishead'):
-                    # this is the head bag!
-                    _write_item(fd, "Multibag-Head-Version", self.head_version)
-                    if self._deprecates:
-                        name = "Multibag-Head-Deprecates"
-                        for p in self._deprecates:
-                            v = p[0]
-                            if len(p) > 1:
-                                v += ",%s" % p[1]
-                            _write_item(fd, name, v)
-
-            # create the multibag files
-            if m.get('ishead'):
-                mbagdir = os.path.join(bagdir, "multibag")
-                if not os.path.isdir(mbagdir):
-                    os.mkdir(mbagdir)
-
-                with io.open(os.path.join(mbagdir, "member-bags.tsv"),
-                             'w', encoding=DEF_ENC) as fd:
-                    for bag in memberbags:
-                        fd.write(u"%s" % bag)
-                        fd.write(u'\n')
-                with io.open(os.path.join(mbagdir, "file-lookup.tsv"),
-                             'w', encoding=DEF_ENC) as fd:
-                    for f in filedest:
-                        fd.write(u"%s\t%s\n" % (f, filedest[f]))
-                with io.open(os.path.join(mbagdir, "aggregation-info.txt"),
-                             'w', encoding=DEF_ENC) as fd:
-                    with self.progenitor.open_text_file("bag-info.txt") as ifd:
-                        for f in ifd:
-                            fd.write(f)
-                
+                filedest[file] = bagname
 
-            yield bagdir
-
-
-    def _record_hash(self, outdir, alg, hash, path, mantype):
-        if mantype not in "manifest tagmanifest".split():
-            raise ValueError("Unknown manifest type: "+mantype)
+        # write out the collected manifest entries
+        self._write_manifests(bagdir, manbuf)
+                
+        # create the bag-info file
+        info = []
+        _write_item(info, 'Multibag-Version', MBAG_VERSION)
+        for name, vals in srcinfo:
+            if name.startswith('Multibag-'):
+                continue
+            if name in info_nopass:
+                continue
+            
+            if not isinstance(vals, list):
+                vals = [vals]
+            if name == 'Internal-Sender-Identifier':
+                _write_item(info, name, bagname)
+                name = 'Multibag-Source-'+name
+            elif name == 'Internal-Sender-Description':
+                _write_item(info, name, m.get(name, MBAG_INTERNAL_SENDER_DESC))
+                name = 'Multibag-Source-'+name
+            elif name == 'External-Identifier':
+                _write_item(info, 'Multibag-Source-'+name, vals)
+                _write_item(info, name, vals[0]+'/mbag:'+bagname)
+                name = 'Bag-Group-Identifier'
+            elif name == 'Bag-Size':
+                name = 'Multibag-Source-'+name
+            elif name == 'Payload-Oxum':
+                vals = ["%s.%s" % (payload_size, payload_count)]
+
+            _write_item(info, name, vals)
+
+        _write_item(info, "Multibag-Tag-Directory", "multibag")
+        if m.get('ishead'):
+            # this is the head bag!
+            _write_item(info, "Multibag-Head-Version", self.head_version)
+            if self._deprecates:
+                deps = []
+                for p in self._deprecates:
+                    v = p[0]
+                    if len(p) > 1:
+                        v += ",%s" % p[1]
+                    deps.append(v)
+                _write_item(info, "Multibag-Head-Deprecates", deps)
+
+        with io.open(os.path.join(bagdir, "bag-info.txt"), 'w',
+                     encoding=DEF_ENC) as fd:
+            fd.write(u"".join(info))
+
+        return filedest
+
+    def _replicate_local(self, srcpath, destpath, hardlink=False):
+        # replicate a file between local disk locations, as a hard link if 
+        # requested and possible.  On Linux, shutil.copy() copies the bytes
+        # in the kernel via sendfile(). 
+        if hardlink:
+            try:
+                os.link(srcpath, destpath)
+                return
+            except OSError:
+                # e.g. on different filesystems; fall back to a copy
+                pass
+        shutil.copy(srcpath, destpath)
+
+    def _write_multibag_files(self, bagdir, memberbags, filedest):
+        # write the multibag tag files into the head bag, bagdir
+        mbagdir = os.path.join(bagdir, "multibag")
+        if not os.path.isdir(mbagdir):
+            os.mkdir(mbagdir)
+
+        with io.open(os.path.join(mbagdir, "member-bags.tsv"),
+                     'w', encoding=DEF_ENC) as fd:
+            fd.write(u"".join([u"%s\n" % bag for bag in memberbags]))
+        with io.open(os.path.join(mbagdir, "file-lookup.tsv"),
+                     'w', encoding=DEF_ENC) as fd:
+            fd.write(u"".join([u"%s\t%s\n" % item
+                               for item in filedest.items()]))
+        self._copy_bag_info(os.path.join(mbagdir, "aggregation-info.txt"))
+
+    def _copy_bag_info(self, destpath):
+        # copy the progenitor's bag-info.txt file to the given path, encoded
+        # as DEF_ENC and with its line endings (CRLF or CR) normalized to LF.
+        if codecs.lookup(self.progenitor.encoding).name != \
+           codecs.lookup(DEF_ENC).name:
+            # needs transcoding
+            with self.progenitor.open_text_file("bag-info.txt",
+                                     encoding=self.progenitor.encoding) as ifd:
+                text = ifd.read()
+            text = text.replace(u"\r\n", u"\n").replace(u"\r", u"\n")
+            with io.open(destpath, 'w', encoding=DEF_ENC) as fd:
+                fd.write(text)
+            return
 
-        manfile = "{0}-{1}.txt".format(mantype, alg)
-        manpath = os.path.join(outdir, manfile)
-        if not os.path.exists(manpath):
-            open(manpath, 'w').close()
-        with io.open(manpath, 'a', encoding=DEF_ENC) as fd:
-            fd.write(hash)
-            fd.write(u' ')
-            fd.write(path)
-            fd.write(u'\n')
+        # same encoding: copy the bytes, minus any byte-order mark
+        with self.progenitor.open_bin_file("bag-info.txt") as ifd:
+            data = ifd.read()
+        if data.startswith(codecs.BOM_UTF8):
+            data = data[len(codecs.BOM_UTF8):]
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        with open(destpath, 'wb') as fd:
+            fd.write(data)
+
+    def _write_manifests(self, outdir, manbuf):
+        # write each buffered manifest to the output bag with a single write
+        for manfile, lines in manbuf.items():
+            with io.open(os.path.join(outdir, manfile), 'w',
+                         encoding=DEF_ENC) as fd:
+                fd.write(u"".join(lines))
+
+def _pack_sizes(sizes, maxsz, tsz):
+    """
+    decide how to pack files with the given sizes into bags according to the
+    "well-packed" algorithm, returning a list giving the (zero-based) index 
+    of the bag each file is assigned to.  The sizes are expected to be sorted
+    in descending order.  
+
+    :param list[int] sizes:  the sizes of the files to pack
+    :param int maxsz:  the maximum size of a bag; a file larger than this is 
+                       put in a bag by itself.
+    :param int tsz:    the target size of a bag; a bag is closed once its 
+                       size exceeds this.
+    """
+    nfiles = len(sizes)
+    assign = [-1] * nfiles
+
+    # nxt leads from an index to the next file not yet assigned (or to 
+    # nfiles if there are none); entries are updated as they are followed
+    nxt = list(range(nfiles + 1))
+    def _next(i):
+        root = i
+        while nxt[root] != root:
+            root = nxt[root]
+        while nxt[i] != root:
+            nxt[i], i = root, nxt[i]
+        return root
+
+    # when sorted, the files small enough to fit in the room left in a bag
+    # are at the end of the list and can be found via bisection
+    negsz = [-sz for sz in sizes]
+    if any(negsz[k] > negsz[k+1] for k in range(nfiles-1)):
+        negsz = None
+
+    remaining = nfiles
+    bag = 0
+    total = 0
+    i = _next(0)
+    while remaining > 0:
+        if total > 0:
+            # find a file that will fit
+            if negsz is not None:
+                i = max(i, bisect_left(negsz, total - maxsz))
+            i = _next(i)
+            while i < nfiles and total + sizes[i] > maxsz:
+                i = _next(i+1)
+            if i >= nfiles:
+                # no more files can be found that will fit in this bag
+                bag += 1
+                total = 0
+                i = _next(0)
+                continue
+        else:
+            i = _next(i)
+
+        # if the bag is empty, this file goes in even if it exceeds our
+        # maxsize (in which case, it will be in the bag by itself).
+        newsz = total + sizes[i]
+        assign[i] = bag
+        nxt[i] = i + 1
+        remaining -= 1
+        if newsz > maxsz or newsz > tsz:
+            # exceeded our target size; start a new one
+            bag += 1
+            total = 0
+            i = _next(0)
+        else:
+            total = newsz
+
+    return assign
 
 class Splitter(object):
     """
@@ -475,7 +751,7 @@ class Splitter(object):
         return out
 
     def split(self, bagpath, outdir, namebasis=None, info_nopass=None,
-              logger=None):
+              logger=None, max_workers=None):
         """
         Split the given bag into multibags according to the strategy of this 
         splitter.  
@@ -495,17 +771,15 @@ class Splitter(object):
                              transformed appropriately.
         :type info_nopass:   list of str
         :param Logger logger: a logger instance to send messages to.
+        :param int max_workers:  the maximum number of threads to use to 
+                             write the output bags; see SplitPlan.apply().
         :rtype:  a list of str, the names of the output bags.
         """
         plan = self.plan(bagpath, namebasis)
 
-        out = []
-        for mb in plan.apply_iter(outdir, info_nopass=info_nopass,logger=logger):
-            ## offer option to serialize
-
-            out.append(mb)
-
-        return out
+        ## offer option to serialize
+        return plan.apply(outdir, info_nopass=info_nopass, logger=logger,
+                          max_workers=max_workers)
         
 
 class WellPackedSplitter(Splitter):
@@ -542,92 +816,84 @@ class WellPackedSplitter(Splitter):
                 
 
     def _create_plan(self, bagpath):
-        bag = ReadOnlyBag(bagpath)
+        out = SplitPlan(ReadOnlyBag(bagpath))
 
-        # these files are sorted by size, biggest one first
-        finfos = self._sorted_files(bag)
+        # the source bag is walked once for this planning pass
+        out._listing = out.progenitor.walk_all()
+        try:
+            # these files are sorted by size, biggest one first
+            finfos = self._sorted_files(out.progenitor, out._listing)
         
-        out = SplitPlan(bag)
-        self._apply_algorithm(finfos, out)
-        out.complete_plan()
+            self._apply_algorithm(finfos, out)
+            out.complete_plan()
+        finally:
+            out._listing = None
 
         return out
 
     def _apply_algorithm(self, finfos, plan):
-        manf = self._new_manifest()
-
-        i = 0
-        while len(finfos) > 0:
-            if i >= len(finfos):
-                # no more files can be found that will fit in this bag
-                plan._manifests.append(manf)
-                manf = self._new_manifest()
-                i = 0
-
-            newsz = manf['totalsize'] + finfos[i]['size']
-            if newsz > self.maxsz:
-                if manf['totalsize'] == 0:
-                    # this file by itself exceeds our maxsize; put it in
-                    # bag by itself.
-                    self._add_to_manifest(finfos, i, manf)
-                    i = 0
-                    plan._manifests.append(manf)
-                    manf = self._new_manifest()
-                else:
-                    # find a smaller one
-                    i += 1
-            else:
-                self._add_to_manifest(finfos, i, manf)
-                if newsz > self.tsz:
-                    # exceeded our target size; start a new one
-                    i = 0
-                    plan._manifests.append(manf)
-                    manf = self._new_manifest()
-
-        if len(manf['contents']) > 0:
-            plan._manifests.append(manf)
+        # the packing is decided on the sizes alone
+        assign = _pack_sizes([f['size'] for f in finfos], self.maxsz, self.tsz)
+
+        # within a bag, files were assigned in list order
+        manfs = [self._new_manifest() for b in range(max(assign or [-1]) + 1)]
+        for i, b in enumerate(assign):
+            self._add_to_manifest(finfos, i, manfs[b])
+        plan._manifests.extend(manfs)
         
         return plan
 
-    def _add_to_manifest(self, files, idx, manifest):
-        fi = files.pop(idx)
+    def _add_to_manifest(self, files, idx, manifest, alive=None):
+        fi = files[idx]
+        if alive is not None:
+            alive[idx] = 0
         manifest['contents'].append(fi['path'][1:])
+        manifest['sizes'].append(fi['size'])
         manifest['totalsize'] += fi['size']
 
     def _new_manifest(self):
         # return an empty manifest
         return {
             'contents': [],
+            'sizes': [],
             'totalsize': 0
         }
         
-    _special = [re.compile(r) for r in
-                       r"^/bagit.txt$ ^/bag-info.txt$ ^/fetch.txt$".split() +
-                       r"^/(tag)?manifest-(\w+).txt$".split()]
+    _special_files = frozenset("/bagit.txt /bag-info.txt /fetch.txt".split())
+    _special_re = re.compile(r"^/(tag)?manifest-(\w+)\.txt$")
     def _is_special(self, filename):
-        for r in self._special:
-            if r.match(filename):
-                return True
-        return False
+        return filename in self._special_files or \
+               self._special_re.match(filename) is not None
 
     @staticmethod
-    def _cmp_by_size(infoa, infob):
-        # we want sort to descend in size
-        out = infob['size'] - infoa['size']
-        if out != 0:
-            return out
-        return ((infoa['path'] < infob['path']) and -1) or \
-               ((infoa['path'] > infob['path']) and +1) or 0
-
-    def _sorted_files(self, bag):
-        finfos = [{"path": p, "size": f.size, "name": p.split('/')[-1]}
-                   for p,f in bag._root.fs.walk.info(namespaces=['details'])
-                       if not f.is_dir and not self._is_special(p)
-                                       and p not in self.forhead]
+    def _size_key(finfo):
+        # sort key that orders files by descending size, then by path
+        return (-finfo['size'], finfo['path'])
+
+    def _sorted_files(self, bag, listing=None):
+        finfos = []
+        for p, sz in self._walk_files(bag, listing):
+            if self._is_special(p) or p in self.forhead:
+                continue
+            # split the path into its parent directory and name just once
+            parent, sep, name = p.rpartition('/')
+            finfos.append({"path": p, "size": sz, "name": name,
+                           "dir": parent + sep})
                           
-        finfos.sort(key=cmp_to_key(self._cmp_by_size))
+        finfos.sort(key=self._size_key)
         return finfos
 
+    def _walk_files(self, bag, listing=None):
+        # iterate through (path, size) pairs for all the files in the bag,
+        # where path is relative to the bag's root and starts with '/'.
+        # listing, if given, is the bag's walk_all() listing, so that the bag
+        # is walked only once when creating a plan.
+        if listing is None:
+            listing = as_extended(bag).walk_all()
+        for path, size, isdir in listing:
+            if not isdir:
+                yield '/' + path, size
+
 class NeighborlySplitter(WellPackedSplitter):
     """
     a Splitter that sets a maximum size limit, tries to minimize the total 
@@ -638,77 +904,89 @@ class NeighborlySplitter(WellPackedSplitter):
     def _apply_algorithm(self, finfos, plan):
         manf = self._new_manifest()
 
-        i = 0
-        while len(finfos) > 0:
-            for dirpath in self._dirpaths_for(finfos, i):
+        # note each file's parent directory once up front
+        for f in finfos:
+            if 'dir' not in f:
+                f['dir'] = self._dirpath(f['path'])
 
-                # fill the open manifest with files in the dirpath directory
-                i = self._select_from_dir(finfos, i, manf, dirpath)
-            
-                if i < 0:
-                    # the manifest is full; open a new one
-                    break
-            
-                if i >= len(finfos):
-                    # no more files in the current dirpath directory will fit 
-                    # in the manifest; start looking for files in the next nearby
+        # the sorted list of directories is computed once; it is rotated to
+        # start at the directory of the first remaining file for each manifest
+        dirs = deque(self._dirpaths_for(finfos))
+        dirindex = dict((d, n) for n, d in enumerate(dirs))
+
+        # files are marked as no longer alive as they are added to manifests
+        nfiles = len(finfos)
+        alive = bytearray([1]) * nfiles
+        remaining = nfiles
+        start = 0    # no file before this index is still alive
+
+        while remaining > 0:
+            while not alive[start]:
+                start += 1
+
+            rot = dirindex[finfos[start]['dir']]
+            dirs.rotate(-rot)
+            try:
+                for dirpath in dirs:
+
+                    # fill the open manifest with files in the dirpath
+                    # directory; if it returns a non-negative index, no more
+                    # files in the current dirpath directory will fit in the
+                    # manifest, so we look for files in the next nearby
                     # directory
-                    i = 0
-                    continue
+                    i = self._select_from_dir(finfos, start, manf, dirpath,
+                                              alive)
+            
+                    if i < 0:
+                        # the manifest is full; open a new one
+                        break
+            finally:
+                dirs.rotate(rot)
                 
             # the manifest is full or there are no more files that will fit in
             # this manifest.  
             plan._manifests.append(manf)
+            remaining -= len(manf['contents'])
             manf = self._new_manifest()
-            i = 0
 
         return plan
 
     def _dirpath(self, path):
         if path == '/':
             return None
-        return path.rsplit('/', 1)[0] + '/'
-
-    def _dirpaths_for(self, finfos, ref):
-        refdir = self._dirpath(finfos[ref]['path'])
+        head, sep, tail = path.rpartition('/')
+        return head + sep
 
-        # sort directories
-        dirs = [self._dirpath(f['path']) for f in finfos]
-        dirs.sort()
+    def _dirpaths_for(self, finfos):
+        # return the sorted, unique list of directories (as noted in each
+        # file's 'dir' item) containing the given files; descendent
+        # directories sort after their anscestors.
+        return sorted(set([f['dir'] for f in finfos]))
 
-        # uniquify
-        for i in range(len(dirs)-1):
-            d = dirs.pop(0)
-            if d != dirs[0]:
-                dirs.append(d)
-
-        # put descendent directories before anscestors
-        i = dirs.index(refdir)
-        return dirs[i:] + dirs[:i]
-
-    def _select_from_dir(self, finfos, i, manifest, dirpath):
+    def _select_from_dir(self, finfos, i, manifest, dirpath, alive):
         if not dirpath.endswith('/'):
             dirpath += '/'
 
         while i < len(finfos):
-            if dirpath == self._dirpath(finfos[i]['path']):
+            if alive[i] and dirpath == finfos[i]['dir']:
                 
                 newsz = manifest['totalsize'] + finfos[i]['size']
                 if newsz > self.maxsz:
                     if manifest['totalsize'] == 0:
                         # this file by itself exceeds our maxsize; put it in
                         # a bag by itself.
-                        self._add_to_manifest(finfos, i, manifest)
+                        self._add_to_manifest(finfos, i, manifest, alive)
                         return -1
                     else:
                         # find a smaller file to put in manifest
                         i += 1
 
                 else:
-                    self._add_to_manifest(finfos, i, manifest)
+                    self._add_to_manifest(finfos, i, manifest, alive)
                     if newsz > self.tsz:
                         # exceeded our target size; start a new one
                         return -1
+                    i += 1
             else:
                 i += 1
                     
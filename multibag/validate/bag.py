@@ -2,45 +2,210 @@
 This module provides the validator implementation for the base BagIt 
 specification.  It delegates this to the LOC bagit module.  
 """
+import os, threading
+from collections import OrderedDict
+
 from .base import (Validator, ValidationResults, ValidationIssue,
-                   ALL, ERROR, WARN, REC, PROB)
+                   ALL, ERROR, WARN, REC, PROB, _LazyBagMixin)
 from ..access.bagit import BagValidationError, BagError, open_bag
 
-class BagValidator(Validator):
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    # Python 2.7 without the futures backport
+    ProcessPoolExecutor = None
+
+# the outcomes of recent bagit validations (which require hashing every file),
+# keyed by the bag's real path and fingerprint, most recently used last.  
+# This is only used by validators that opt in (see BagValidator).
+_cache = OrderedDict()
+_cache_size = 100
+_cache_lock = threading.Lock()
+
+def clear_cache():
+    """
+    forget the outcomes of all previous cached BagIt validations so that the 
+    next validation of any bag will be done from scratch.
+    """
+    with _cache_lock:
+        _cache.clear()
+
+def _bag_fingerprint(bagpath):
+    # return a value that will change when the bag at the given path is
+    # changed, or None if one cannot be determined.  For a bag directory,
+    # this is built from the names, sizes, and modification times of all
+    # its files; this is much cheaper than hashing the files' contents.
+    def _stamp(st):
+        return (st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime))
+
+    try:
+        if not os.path.isdir(bagpath):
+            return _stamp(os.stat(bagpath))
+
+        stamps = []
+        for root, dirs, files in os.walk(bagpath):
+            dirs.sort()
+            for f in sorted(files):
+                stamps.append((root[len(bagpath):], f) +
+                              _stamp(os.stat(os.path.join(root, f))))
+        return hash(tuple(stamps))
+    except (OSError, TypeError):
+        return None
+
+def _cache_key(bagpath):
+    # return the key for caching the outcome of validating the given bag or
+    # None if the outcome should not be cached.  The bag's real path is used
+    # so that a bag reached via a link shares its outcome; like the rest of
+    # the cache, this only applies to validators created with use_cache=True.
+    fp = _bag_fingerprint(bagpath)
+    if fp is None:
+        return None
+    return (os.path.realpath(bagpath), fp)
+
+def _cache_outcome(key, outcome):
+    if key:
+        with _cache_lock:
+            _cache[key] = outcome
+            while len(_cache) > _cache_size:
+                _cache.popitem(last=False)
+
+def _cached_outcome(key):
+    # return the cached outcome with the given key (marking it as recently
+    # used) or None if it is not cached
+    with _cache_lock:
+        out = _cache.pop(key, None)
+        if out is not None:
+            _cache[key] = out
+    return out
+
+def _bagit_outcome(bag):
+    # run the bagit validation on an open bag, returning the outcome as a 
+    # 2-tuple of a pass flag and a tuple of comments
+    passed = True
+    comments = []
+    try:
+        bag.validate()
+    except BagValidationError as ex:
+        passed = False
+        comments = [ex.message] + ex.details
+    except BagError as ex:
+        passed = False
+        comments = [ex.message]
+    return (passed, tuple(comments))
+
+def _bagit_outcome_for(bagpath):
+    # _bagit_outcome() for the bag at the given path; this is run in the
+    # worker processes of validate_many()
+    return _bagit_outcome(open_bag(bagpath))
+
+class BagValidator(_LazyBagMixin, Validator):
     """
     A validator that tests whether a given Bag (serialized or otherwise) complies
     with the base BagIt specification.
+
+    Because checking compliance requires calculating the checksums of all of
+    the bag's files, a caller may opt to have the outcome cached for the bag;
+    the check is then not repeated for a bag whose files have not changed 
+    in name, size, or modification time since it was last validated.  
+    Note that this will not catch corruption that leaves a file's size and
+    modification time unchanged.  (See also clear_cache().)
     """
 
-    def __init__(self, bagpath):
+    def __init__(self, bagpath, use_cache=False):
         """
         initialize the validator for the bag with a given path.  
 
         :param str bagpath:  the target bag, either as a directory for an 
                              unserialized bag or a file for a serialized one
+        :param bool use_cache:  if True, reuse the cached outcome of a 
+                             previous validation of this bag if the bag 
+                             appears unchanged, and cache the outcome of 
+                             a new one.  
         """
         super(BagValidator, self).__init__(bagpath)
-        self.bag = open_bag(bagpath)
+        self.use_cache = use_cache
 
     def validate(self, want=PROB, results=None):
+        if not (want & ERROR):
+            # the only test is an ERROR test; don't bother opening the bag
+            return results or ValidationResults(str(self.target), want)
+
         if not results:
-            results = ValidationResults(str(self.bag), want)
-
-        if (want & ERROR):
-            issue = ValidationIssue("2-Bag", ERROR,
-                                    "Bag must be compliant BagIt bag")
-            passed = True
-            comments = []
-            try:
-                self.bag.validate()
-            except BagValidationError as ex:
-                passed = False
-                comments = [ex.message] + ex.details
-            except BagError as ex:
-                passed = False
-                comments = [ex.message]
-
-            results._err(issue, passed, comments)
+            results = ValidationResults(str(self.target), want)
+
+        self._add_outcome(results, self._check_bag())
 
         return results
 
+    def _add_outcome(self, results, outcome):
+        # record the outcome of the bagit validation into the results
+        passed, comments = outcome
+        issue = ValidationIssue("2-Bag", ERROR,
+                                "Bag must be compliant BagIt bag")
+        results._err(issue, passed, list(comments))
+
+    def _check_bag(self):
+        # run the bagit validation, returning the outcome as a 2-tuple of
+        # a pass flag and a tuple of comments.  If caching is in use, a cached
+        # outcome is returned if the bag has not changed since it was checked.
+        if not self.use_cache:
+            return _bagit_outcome(self.bag)
+
+        key = _cache_key(self.target)
+        out = key and _cached_outcome(key)
+        if out is None:
+            out = _bagit_outcome(self.bag)
+            _cache_outcome(key, out)
+        return out
+
+def validate_many(bagpaths, want=PROB, max_workers=None, use_cache=False):
+    """
+    test whether each of the given bags complies with the base BagIt 
+    specification.  As checking a bag requires calculating the checksums
+    of all its files, bags that need checking are checked in parallel via
+    a pool of processes.  
+
+    :param bagpaths:         the bags to validate, each either as a directory
+                             for an unserialized bag or a file for a 
+                             serialized one
+    :type  bagpaths:         list of str
+    :param int want:         bit-wise and-ed codes indicating which types of 
+                             test results are desired (see 
+                             BagValidator.validate())
+    :param int max_workers:  the maximum number of processes to use; if None,
+                             the number of CPUs is used; a value of 1 checks
+                             the bags one at a time.  
+    :param bool use_cache:   if True, the outcome for a bag that has not 
+                             changed since it was last validated is taken 
+                             from the cache, as with BagValidator.
+    :rtype: a list of ValidationResults, one for each bag in bagpaths in 
+            order
+    """
+    validators = [BagValidator(p, use_cache) for p in bagpaths]
+    if not (want & ERROR):
+        return [v.validate(want) for v in validators]
+
+    keys = [None] * len(validators)
+    if use_cache:
+        keys = [_cache_key(v.target) for v in validators]
+    outcomes = [k and _cached_outcome(k) for k in keys]
+    todo = [i for i in range(len(outcomes)) if outcomes[i] is None]
+
+    if ProcessPoolExecutor is None or len(todo) < 2 or \
+       (max_workers is not None and max_workers < 2):
+        checked = [_bagit_outcome(validators[i].bag) for i in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            checked = list(pool.map(_bagit_outcome_for,
+                                    [validators[i].target for i in todo]))
+    for i, outcome in zip(todo, checked):
+        outcomes[i] = outcome
+        _cache_outcome(keys[i], outcome)
+
+    out = []
+    for v, outcome in zip(validators, outcomes):
+        results = ValidationResults(str(v.target), want)
+        v._add_outcome(results, outcome)
+        out.append(results)
+    return out
+
@@ -1,20 +1,28 @@
 """
 This module provides base classes and infrastructure for multibag validation
 """
-import sys
+import sys, json
 from collections import OrderedDict
 try:
     from collections.abc import Sequence
 except ImportError:
     from collections import Sequence
 
+try:
+    import orjson
+except ImportError:
+    # the faster JSON encoder is optional
+    orjson = None
+
 from ..constants import CURRENT_VERSION
 from ..access.bagit import BagValidationError, BagError, open_bag
 
 if sys.version_info[0] > 2:
     _unicode = str
+    _intern = sys.intern
 else:
     _unicode = unicode
+    _intern = intern
 
 ERROR = 1
 WARN  = 2
@@ -22,12 +30,24 @@ REC   = 4
 ALL   = 7
 PROB  = 3
 issuetypes = [ ERROR, WARN, REC ]
+_issuetype_set = frozenset(issuetypes)
 
 type_labels = { ERROR: "error", WARN: "warning", REC: "recommendation" }
 ERROR_LAB = type_labels[ERROR]
 WARN_LAB  = type_labels[WARN]
 REC_LAB   = type_labels[REC]
 
+def _comment_list(comments):
+    # return the given comment or comments as a list.  The common types are 
+    # checked first as the Sequence ABC test is comparatively slow.
+    if isinstance(comments, list):
+        return comments
+    if isinstance(comments, (str, _unicode)):
+        return [ comments ]
+    if isinstance(comments, (tuple, Sequence)):
+        return list(comments)
+    return [ comments ]
+
 class ValidationIssue(object):
     """
     an object capturing issues detected by a validator.  It contains attributes 
@@ -37,22 +57,31 @@ class ValidationIssue(object):
     ERROR = issuetypes[0]
     WARN  = issuetypes[1]
     REC   = issuetypes[2]
+
+    __slots__ = ('_pver', '_lab', '_spec', '_type', '_passed', '_comm',
+                 '_comm_tuple', '_summary', '_description', '_json')
     
     def __init__(self, idlabel='', issuetype=ERROR, spec='', passed=True, 
                  comments=None, profver=CURRENT_VERSION):
         if comments:
-            if isinstance(comments, (str, _unicode)):
-                comments = [ comments ]
-            elif isinstance(comments, Sequence) and \
-                 not isinstance(comments, list):
-                comments = list(comments)
+            comments = _comment_list(comments)
+
+        # many issues share the same label and specification text
+        if type(idlabel) is str:
+            idlabel = _intern(idlabel)
+        if type(spec) is str:
+            spec = _intern(spec)
 
+        self._summary = None
+        self._description = None
+        self._json = None
         self._pver = profver
         self._lab = idlabel
         self._spec = spec
         self.type = issuetype
         self._passed = passed
         self._comm = []
+        self._comm_tuple = None
         if comments:
             self._comm.extend([str(c) for c in comments])
 
@@ -65,6 +94,7 @@ class ValidationIssue(object):
     @profile_version.setter
     def profile_version(self, version):
         self._pver = version
+        self._uncache()
 
     @property
     def label(self):
@@ -76,6 +106,7 @@ class ValidationIssue(object):
     @label.setter
     def label(self, value):
         self._lab = value
+        self._uncache()
 
     @property
     def type(self):
@@ -85,10 +116,11 @@ class ValidationIssue(object):
         return self._type
     @type.setter
     def type(self, issuetype):
-        if issuetype not in issuetypes:
+        if issuetype not in _issuetype_set:
             raise ValueError("ValidationIssue: not a recognized issue type: "+
-                             issuetype)
+                             str(issuetype))
         self._type = issuetype
+        self._uncache()
 
     @property
     def specification(self):
@@ -100,6 +132,7 @@ class ValidationIssue(object):
     @specification.setter
     def specification(self, text):
         self._spec = text
+        self._uncache()
 
     def add_comment(self, text):
         """
@@ -108,6 +141,15 @@ class ValidationIssue(object):
         specifying a line number)
         """
         self._comm.append(str(text))
+        self._comm_tuple = None
+        self._uncache()
+
+    def _uncache(self):
+        # forget the summary, description, and JSON data built from this 
+        # issue's data; they will be rebuilt when next requested
+        self._summary = None
+        self._description = None
+        self._json = None
 
     @property
     def comments(self):
@@ -115,7 +157,9 @@ class ValidationIssue(object):
         return a tuple of strings giving comments about the issue that are
         context-specific to its application
         """
-        return tuple(self._comm)
+        if self._comm_tuple is None:
+            self._comm_tuple = tuple(self._comm)
+        return self._comm_tuple
 
     def passed(self):
         """
@@ -134,12 +178,15 @@ class ValidationIssue(object):
         """
         a one-line description of the issue that was tested.  
         """
-        status = (self.passed() and "PASSED") or type_labels[self._type].upper()
-        out = "{0}: multibag {1} {2}".format(status, self.profile_version, 
-                                             self.label)
-        if self.specification:
-            out += ": {0}".format(self.specification)
-        return out
+        if self._summary is None:
+            status = (self.passed() and "PASSED") or \
+                     type_labels[self._type].upper()
+            out = "{0}: multibag {1} {2}".format(status, self.profile_version, 
+                                                 self.label)
+            if self.specification:
+                out += ": {0}".format(self.specification)
+            self._summary = out
+        return self._summary
 
     @property
     def description(self):
@@ -149,14 +196,15 @@ class ValidationIssue(object):
         providing more details.  Each comment is delimited with a newline; 
         A newline is not added to the end of the last comment.
         """
-        out = self.summary
-        if self._comm:
-            comms = self._comm
-            if not isinstance(comms, (list, tuple)):
-                comms = [comms]
-            out += "\n   "
-            out += "\n   ".join(comms)
-        return out
+        if self._description is None:
+            out = [self.summary]
+            if self._comm:
+                comms = self._comm
+                if not isinstance(comms, (list, tuple)):
+                    comms = [comms]
+                out.extend(comms)
+            self._description = "\n   ".join(out)
+        return self._description
 
     def __str__(self):
         out = self.summary
@@ -176,14 +224,17 @@ class ValidationIssue(object):
         return an OrderedDict that can be encoded into a JSON object node
         which contains the data in this ValidationIssue.
         """
-        return OrderedDict([
-            ("type", type_labels[self.type]),
-            ("profile_name", self.profile),
-            ("profile_version", self.profile_version),
-            ("label", self.label),
-            ("spec", self.message),
-            ("comments", self.comments)
-        ])
+        if self._json is None:
+            self._json = OrderedDict([
+                ("type", type_labels[self.type]),
+                ("profile_name", "multibag"),
+                ("profile_version", self.profile_version),
+                ("label", self.label),
+                ("spec", self.specification),
+                ("comments", self.comments)
+            ])
+        # return a copy so that the cached data cannot be altered
+        return OrderedDict(self._json)
 
     @classmethod
     def from_tuple(cls, data):
@@ -199,6 +250,8 @@ class ValidationResults(object):
     REC   = REC
     ALL   = ALL
     PROB  = PROB
+
+    __slots__ = ('target', 'want', 'defversion', 'results')
     
     def __init__(self, target, want=ALL, version=CURRENT_VERSION):
         """
@@ -226,6 +279,22 @@ class ValidationResults(object):
             REC:   []
         }
 
+    def _buckets(self, issuetype):
+        # return the lists of issues for the requested types
+        results = self.results
+        return [results[t] for t in issuetypes if t & issuetype]
+
+    def iter_applied(self, issuetype=ALL):
+        """
+        iterate through the validation tests that were applied of the 
+        requested types.  
+        :param int issuetype:  an bit-wise and-ing of the desired issue types
+                               (default: ALL)
+        """
+        for issues in self._buckets(issuetype):
+            for issue in issues:
+                yield issue
+
     def applied(self, issuetype=ALL):
         """
         return a list of the validation tests that were applied of the
@@ -234,12 +303,8 @@ class ValidationResults(object):
                                (default: ALL)
         """
         out = []
-        if ERROR & issuetype:
-            out += self.results[ERROR]
-        if WARN & issuetype:
-            out += self.results[WARN]
-        if REC & issuetype:
-            out += self.results[REC]
+        for issues in self._buckets(issuetype):
+            out.extend(issues)
         return out
 
     def count_applied(self, issuetype=ALL):
@@ -247,47 +312,68 @@ class ValidationResults(object):
         return the number of validation tests of requested types that were 
         applied to the named bag.
         """
-        return len(self.applied(issuetype))
+        return sum(len(issues) for issues in self._buckets(issuetype))
 
     def failed(self, issuetype=ALL):
         """
         return the validation tests of the requested types which failed when
         applied to the named bag.
         """
-        return [issue for issue in self.applied(issuetype) if issue.failed()]
+        return [issue for issue in self.iter_applied(issuetype)
+                      if not issue.passed()]
     
     def count_failed(self, issuetype=ALL):
         """
         return the number of validation tests of requested types which failed
         when applied to the named bag.
         """
-        return len(self.failed(issuetype))
+        return sum(1 for issue in self.iter_applied(issuetype)
+                     if not issue.passed())
 
     def passed(self, issuetype=ALL):
         """
         return the validation tests of the requested types which passed when
         applied to the named bag.
         """
-        return [issue for issue in self.applied(issuetype) if issue.passed()]
+        return [issue for issue in self.iter_applied(issuetype)
+                      if issue.passed()]
     
     def count_passed(self, issuetype=ALL):
         """
         return the number of validation tests of requested types which passed
         when applied to the named bag.
         """
-        return len(self.passed(issuetype))
+        return sum(1 for issue in self.iter_applied(issuetype)
+                     if issue.passed())
+
+    def to_json_bytes(self, issuetype=ALL):
+        """
+        return the validation tests of the requested types that were applied
+        as a UTF-8-encoded JSON array of objects (as produced by 
+        ValidationIssue.to_json_obj()).  The orjson package is used to do
+        the encoding if it is installed; either way, the output is compact
+        with non-ASCII characters left unescaped.
+        """
+        data = [issue.to_json_obj() for issue in self.iter_applied(issuetype)]
+        if orjson:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
 
     def ok(self):
         """
         return True if none of the validation tests of the types specified by 
         the constructor's want parameter failed.
         """
-        return self.count_failed(self.want) == 0
+        # stops at the first failure
+        return all(issue.passed() for issue in self.iter_applied(self.want))
 
     def _add_issue(self, issue, type, passed, comments=None):
         """
         add an issue to this result.  The issue will be updated with its 
         type set to type and its status set to passed (True) or failed (False).
+        The issue instance itself is saved to this result, so it should not 
+        be altered or re-used by the caller afterward.
 
         :param ValidationIssue issue:  the issue to add
         :param int             type:   the issue type code (ERROR, WARN, 
@@ -298,21 +384,13 @@ class ValidationResults(object):
                                          issue instance.
         :type comments: str or list of str
         """
-        issue.type = type
         issue._passed = bool(passed)
+        issue.type = type     # (this also resets the issue's summary)
 
         if comments:
-            if isinstance(comments, (str, _unicode)):
-                comments = [ comments ]
-            elif isinstance(comments, Sequence) and \
-                 not isinstance(comments, list):
-                comments = list(comments)
-            for comm in comments:
+            for comm in _comment_list(comments):
                 issue.add_comment(comm)
         
-        issue = ValidationIssue(issue._lab, issue.type,issue._spec, issue._passed,
-                                (issue.comments and list(issue.comments)) or None,
-                                issue._pver)
         self.results[type].append(issue)
 
     def _err(self, issue, passed, comments=None):
@@ -342,6 +420,16 @@ class ValidationResults(object):
         """
         self._add_issue(issue, REC, passed, comments)
 
+    def _merge(self, other):
+        """
+        add all of the issues collected in another ValidationResults instance
+        to this one.  The issues themselves are not copied, so the other 
+        instance should not be used afterward.  
+        """
+        results = self.results
+        for issuetype, issues in other.results.items():
+            results[issuetype].extend(issues)
+
     def _issue(self, label, message):
         """
         return a new ValidationIssue instance that is part of this validator's
@@ -363,30 +451,32 @@ class MultibagValidationError(BagValidationError):
         self.results = results
 
         details = []
-        if results.count_failed() == 0:
+        failed = results.failed()
+        if len(failed) == 0:
             # shouldn't happen
             msg = "Unknown Multibag validation failure"
-        elif results.count_failed() == 1:
-            msg = results.failed()[0].summary
-            details = list(results.failed()[0].comments)
+        elif len(failed) == 1:
+            msg = failed[0].summary
+            details = list(failed[0].comments)
         else:
-            msg = "{0} validation errors detected".format(results.count_failed())
-            details = [i.description for i in results.failed()]
+            msg = "{0} validation errors detected".format(len(failed))
+            details = [i.description for i in failed]
 
         super(MultibagValidationError, self).__init__(msg, details)
 
     def __str__(self):
-        if not self.results or self.results.count_failed() < 2:
+        failed = self.results and self.results.failed()
+        if not failed or len(failed) < 2:
             return super(MultibagValidationError, self).__str__()
 
-        out = self.message
-        if self.results.count_failed() > 3:
-            out += ", including"
-        out += ":"
-        failed = self.results.failed()[0:3]
-        for f in failed:
-            out += "\n\n * "+f.description
-        return out
+        out = [self.message]
+        if len(failed) > 3:
+            out.append(", including")
+        out.append(":")
+        for f in failed[0:3]:
+            out.append("\n\n * ")
+            out.append(f.description)
+        return "".join(out)
 
 class Validator(object):
     """
@@ -456,4 +546,21 @@ class Validator(object):
         if not results.ok():
             raise MultibagValidationError(results)
 
+class _LazyBagMixin(object):
+    """
+    a mixin for a Validator whose target is the path to a single bag (either
+    a directory or a serialized file), providing access to the bag.  The 
+    bag is not opened until it is first needed.
+    """
+    _bag = None
+
+    @property
+    def bag(self):
+        """
+        the target bag, opened when first needed
+        """
+        if self._bag is None:
+            self._bag = open_bag(self.target)
+        return self._bag
+
 
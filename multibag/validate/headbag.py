@@ -1,18 +1,68 @@
 """
 This module provides the validator implementation for validating head bags.
 """
-import os
+import os, re
+
 try:
-    from urllib.parse import urlparse
+    from concurrent.futures import ThreadPoolExecutor
 except ImportError:
-    from urlparse import urlparse
+    # Python 2.7 without the futures backport
+    ThreadPoolExecutor = None
+
+from fs.errors import NoSysPath
 
 from .base import (Validator, ValidationIssue, ValidationResults, 
-                   ALL, ERROR, WARN, REC, PROB, CURRENT_VERSION)
+                   ALL, ERROR, WARN, REC, PROB, CURRENT_VERSION, _LazyBagMixin)
 from .bag import BagValidator
 from ..access.bagit import BagValidationError, BagError, open_bag, _load_tag_file
 
-class HeadBagValidator(Validator):
+_ossepre = re.compile(re.escape(os.sep))
+
+# the prefixes of payload file names that are not expected to be listed in
+# the file lookup
+_hidden = (".", "_")
+
+# matches the start of an absolute URL:  a scheme followed by a non-empty
+# network location
+_absurlre = re.compile(r'^[A-Za-z][A-Za-z0-9+\-.]*://[^/?#]+')
+
+# matches the start of an absolute URI (e.g. a URL or a PID like doi:...): 
+# a scheme of at least two characters (so that a Windows drive letter, as 
+# in C:\x, is not taken for one) followed by a colon and a non-empty body
+_absurire = re.compile(r'^[A-Za-z][A-Za-z0-9+\-.]+:\S')
+
+# splits a Multibag-Head-Deprecates value, VERSION[, BAGNAME], into its
+# (stripped) version and bag name; a third group captures any extra fields
+_deprecatesre = re.compile(r'^\s*([^,]*?)\s*(?:,\s*([^,]*?)\s*)?(,.*)?$', re.S)
+
+def _last(data, key, default=None):
+    # return the last value of a bag-info element that may be repeated (and
+    # so given as a list) or default if the element is not set
+    value = data.get(key, default)
+    if value and isinstance(value, list):
+        return value[-1]
+    return value
+
+def _lines_comment(linenos):
+    # format a list of line numbers into an issue comment, "line N" or 
+    # "lines N, N, ...".  Up to 4 numbers are all shown; a longer list is 
+    # cut to its first 3 numbers followed by "...".  Return None if the 
+    # list is empty.
+    if not linenos:
+        return None
+    s = (len(linenos) > 1 and "s") or ""
+    if len(linenos) > 4:
+        linenos = linenos[:3] + ['...']
+    return "line{0} {1}".format(s, ", ".join([str(n) for n in linenos]))
+
+def _as_list(value):
+    # bag-info values appear as a list only when the element is repeated;
+    # return the value(s) always as a list
+    if isinstance(value, list):
+        return value
+    return [value]
+
+class HeadBagValidator(_LazyBagMixin, Validator):
     """
     A validator that tests whether a given Bag (serialized or otherwise) complies
     with the Multibag requirements for serving as a head bag.
@@ -27,7 +77,17 @@ class HeadBagValidator(Validator):
         """
         super(HeadBagValidator, self).__init__(bagpath)
         self.bagpath = bagpath
-        self.bag = open_bag(bagpath)
+        self._isdir_cache = None
+
+    def _isdir(self, path):
+        # return self.bag.isdir(path); during a validate() run, the answer
+        # is remembered, as several tests check the same tag directory
+        cache = self._isdir_cache
+        if cache is None:
+            return self.bag.isdir(path)
+        if path not in cache:
+            cache[path] = self.bag.isdir(path)
+        return cache[path]
 
     def validate(self, want=PROB, results=None):
         """
@@ -48,25 +108,45 @@ class HeadBagValidator(Validator):
         if not out:
             out = ValidationResults(self.target, want)
 
-        # validate against the base BagIt spec
-        BagValidator(self.bagpath).validate(want, out)
-
-        version = self.bag.info.get("Multibag-Version")
-        if version and isinstance(version, list):
-            version = version[-1]
+        if ThreadPoolExecutor is None:
+            # validate against the base BagIt spec
+            BagValidator(self.bagpath).validate(want, out)
+            self._validate_multibag(want, out)
+            return out
 
-        self.validate_version(want, out, version)
-        self.validate_reference(want, out, version)
-        self.validate_tag_directory(want, out, version)
-        self.validate_head_version(want, out, version)
-        self.validate_head_deprecates(want, out, version)
-        self.validate_baginfo_recs(want, out, version)
-        self.validate_member_bags(want, out, version)
-        self.validate_file_lookup(want, out, version)
-        self.validate_aggregation_info(want, out, version)
+        # The BagIt validation, which must hash every file, is done in a 
+        # separate thread (with its own handle on the bag) while the multibag
+        # tests are run; the results are merged afterward in the usual order.
+        bagout = ValidationResults(out.target, want, out.defversion)
+        mbout = ValidationResults(out.target, want, out.defversion)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            bagtests = pool.submit(BagValidator(self.bagpath).validate,
+                                   want, bagout)
+            self._validate_multibag(want, mbout)
+            bagtests.result()
+        out._merge(bagout)
+        out._merge(mbout)
 
         return out
 
+    def _validate_multibag(self, want, out):
+        # run all of the multibag-specific tests
+        version = _last(self.bag.info, "Multibag-Version")
+
+        self._isdir_cache = {}
+        try:
+            self.validate_version(want, out, version)
+            self.validate_reference(want, out, version)
+            self.validate_tag_directory(want, out, version)
+            self.validate_head_version(want, out, version)
+            self.validate_head_deprecates(want, out, version)
+            self.validate_baginfo_recs(want, out, version)
+            self.validate_member_bags(want, out, version)
+            self.validate_file_lookup(want, out, version)
+            self.validate_aggregation_info(want, out, version)
+        finally:
+            self._isdir_cache = None
+
     def validate_version(self, want=ALL, results=None, version=CURRENT_VERSION):
         """
         ensure that the version information is correct
@@ -74,6 +154,8 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & (ERROR|WARN)):
+            return out
 
         data = self.bag.info
 
@@ -101,6 +183,8 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & (ERROR|REC)):
+            return out
 
         data = self.bag.info
         
@@ -113,15 +197,12 @@ class HeadBagValidator(Validator):
         t = out._issue("3-Reference-val",
                        "Multibag-Reference value must be an absolute URL " +
                        "(not an empty value)")
-        url = data["Multibag-Reference"]
-        if isinstance(url, list):
-            url = url[-1]
+        url = _last(data, "Multibag-Reference")
         out._err(t, bool(url))
 
         t = out._issue("3-Reference-val",
                        "Multibag-Reference value must be an absolute URL")
-        url = urlparse(url)
-        out._err(t, url.scheme and url.netloc)
+        out._err(t, bool(_absurlre.match(url)))
 
         return out
 
@@ -129,13 +210,13 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & ERROR):
+            return out
 
         data = self.bag.info
         
         if "Multibag-Tag-Directory" in data:
-            mdir = data["Multibag-Tag-Directory"]
-            if not isinstance(mdir, list):
-                mdir = [mdir]
+            mdir = _as_list(data["Multibag-Tag-Directory"])
 
             t = out._issue("3-Tag-Directory",
                            "bag-info.txt: Value for Multibag-Tag-Directory "+
@@ -151,13 +232,13 @@ class HeadBagValidator(Validator):
 
             t = out._issue("3-Tag-Directory",
                            "Multibag-Tag-Directory must exist as directory")
-            out._err(t, self.bag.isdir(mdir[-1]))
+            out._err(t, self._isdir(mdir[-1]))
 
         else:
             t = out._issue("3-Tag-Directory",
                            "Default Multibag-Tag-Directory, multibag, must "+
                            "exist as a directory")
-            out._err(t, self.bag.isdir("multibag"))
+            out._err(t, self._isdir("multibag"))
 
         return out
 
@@ -165,12 +246,12 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & (ERROR|WARN)):
+            return out
 
         data = self.bag.info
         if "Multibag-Head-Version" in data:
-            value = data["Multibag-Head-Version"]
-            if not isinstance(value, list):
-                value = [value]
+            value = _as_list(data["Multibag-Head-Version"])
 
             t = out._issue("3-Head-Version_nonempty",
                            "bag-info.txt: Value for Multibag-Head-Version "+
@@ -196,19 +277,17 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & (ERROR|WARN)):
+            return out
 
         data = self.bag.info
         if "Multibag-Head-Deprecates" not in data:
             return out
 
-        headver = data.get("Multibag-Head-Version")
-        if isinstance(headver, list) and len(headver) > 0:
-            headver = headver[-1]
+        headver = _last(data, "Multibag-Head-Version")
         assert headver
 
-        values = data["Multibag-Head-Deprecates"]
-        if not isinstance(values, list):
-            values = [values]
+        values = _as_list(data["Multibag-Head-Deprecates"])
 
         t = out._issue("3-Head-Deprecates_notempty",
            "bag-info.txt: Value for Multibag-Head-Deprecates should not be empty")
@@ -216,25 +295,18 @@ class HeadBagValidator(Validator):
         if t.failed():
             return out
 
-        empty = True
-        selfdeprecating = False
-        badfmt = []
-        for val in values:
-            if val:
-                empty = False
-            parts = [p.strip() for p in val.split(',')]
-            if len(parts) > 2:
-                badfmt.append(val)
-            selfdeprecating = selfdeprecating or parts[0] == headver or \
-                              (len(parts) > 1 and parts[1] == self.bag._name)
+        # each value parsed into (version, bagname, extra fields)
+        parsed = [_deprecatesre.match(val).groups() for val in values]
+        bagname = self.bag._name
+        empty = not any(values)
+        badfmt = [val for val, p in zip(values, parsed) if p[2] is not None]
+        selfdeprecating = any(p[0] == headver or p[1] == bagname
+                              for p in parsed)
 
         t = out._issue("3-Head-Deprecates_format",
                        "bag-info.txt: Multibag-Head-Deprecates value must "+
                        "match format: VERSION[, BAGNAME]")
-        comm = None
-        if len(badfmt) > 0:
-            comm = list(badfmt)
-        out._err(t, len(badfmt) == 0, comm)
+        out._err(t, len(badfmt) == 0, badfmt)
         
         t = out._issue("3-Head-Deprecates_notempty",
                        "bag-info.txt: Value for Multibag-Head-Deprecates "+
@@ -252,19 +324,22 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & (ERROR|REC)):
+            return out
 
         data = self.bag.info
 
         for el in ["Internal-Sender-Identifier",
                    "Internal-Sender-Description", "Bag-Group-Identifier"]:
+            value = data.get(el)
             t = out._issue("3-2", "Recommed adding value for "+el+ 
                            " into bag-info.txt file")
-            out._rec(t, el in data and len(data[el]) > 0 and data[el][-1])
+            out._rec(t, bool(value) and value[-1])
             if t.failed():
                 continue
             t = out._issue("3-2", "bag-info.txt: "+el+" element should not "+
                            "have empty values")
-            out._err(t, all(data[el]))
+            out._err(t, all(value))
 
         return out
 
@@ -272,22 +347,11 @@ class HeadBagValidator(Validator):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & (ERROR|WARN)):
+            return out
 
-        ishead = self.bag.is_head_multibag()
-        mdir = self.bag.info.get("Multibag-Tag-Directory")
+        mdir = self._head_tag_directory(out)
         if not mdir:
-            mdir = "multibag"
-        if not isinstance(mdir, list):
-            mdir = [mdir]
-        mdir = mdir[-1]
-
-        assert mdir
-        assert ishead
-
-        t = out._issue("3-Tag-Directory",
-                       "Multibag-Tag-Directory must exist as directory")
-        out._err(t, self.bag.isdir(mdir))
-        if t.failed():
             return out
 
         if version == "0.2":
@@ -297,181 +361,108 @@ class HeadBagValidator(Validator):
 
         return out
 
+    def _tag_directory(self):
+        # return the name of the bag's multibag tag directory
+        mdir = self.bag.info.get("Multibag-Tag-Directory")
+        if not mdir:
+            mdir = "multibag"
+        return _as_list(mdir)[-1]
+
+    def _head_tag_directory(self, out):
+        # test that the head bag's multibag tag directory exists, returning
+        # its name, or None if it does not exist
+        assert self.bag.is_head_multibag()
+        mdir = self._tag_directory()
+        assert mdir
+
+        t = out._issue("3-Tag-Directory",
+                       "Multibag-Tag-Directory must exist as directory")
+        out._err(t, self._isdir(mdir))
+        if t.failed():
+            return None
+        return mdir
+
     def _validate_group_members(self, mdir, out, want=ALL):
-        mbemf = "/".join([mdir, "group-members.txt"])
+        return self._validate_member_list(mdir, "group-members.txt", None, 2,
+                                          "BAGNAME[ URL]", out)
+
+    def _validate_member_bags_03(self, mdir, out, want=ALL):
+        return self._validate_member_list(mdir, "member-bags.tsv", '\t', None,
+                                          "BAGNAME[\tURL][\t...]", out)
+
+    def _validate_member_list(self, mdir, listfile, sep, maxfields, fmt, out):
+        # test the file listing the member bags (member-bags.tsv or, in 
+        # version 0.2, group-members.txt) whose lines have fields separated
+        # by sep (or whitespace, if None) and at most maxfields fields.
+        mbemf = mdir + "/" + listfile
         t = out._issue("4.0-1", "Multibag tag directory must contain a "+
-                       "group-members.txt file")
+                       listfile+" file")
         out._err(t, self.bag.isfile(mbemf))
         if t.failed():
             return out
 
-        badfmt = []
-        badurl = []
-        replicated = []
-        found = set()
-        foundme = False
-        last = None
-        with self.bag.open_text_file(mbemf) as fd:
-            i = 0
-            for line in fd:
-                i += 1
-                if not line.strip():
-                    continue
-                parts = [f.strip() for f in line.strip().split()]
-                last = parts[0]
-                if last == self.bag._name:
-                    foundme = True
-                if last in found:
-                    replicated.append(i)
-                else:
-                    found.add(last)
-                if len(parts) > 1 and len(parts[1]) > 0:
-                    url = urlparse(parts[1])
-                    if not url.scheme or url.netloc:
-                        badurl.append(i)
-
-                if len(parts) > 2:
-                    badfmt.append(i)
-                    
+        bagname = self.bag._name
+        badfmt, badurl, replicated, found, last = \
+            self._parse_member_list(mbemf, sep, maxfields)
 
-        t = out._issue("4.1-1", "group-members.txt lines must match "+
-                       "format, BAGNAME[ URL]")
-        comm = None
-        if badfmt:
-            s = (len(badfmt) > 1 and "s") or ""
-            if len(badfmt) > 4:
-                badfmt[3] = '...'
-                badfmt = badfmt[:4]
-            comm = "line{0} {1}".format(s, ", ".join([str(b) for b in badfmt]))
+        t = out._issue("4.1-1", listfile+" lines must match format, "+fmt)
+        comm = _lines_comment(badfmt)
         out._err(t, len(badfmt) == 0, comm)
 
-        t = out._issue("4.1-2", "group-members.txt: URL field must be an "+
-                       "absolute URL")
-        comm = None
-        if badurl:
-            s = (len(badurl) > 1 and "s") or ""
-            if len(badurl) > 4:
-                badurl[3] = '...'
-                badurl = badurl[:4]
-            comm = "line{0} {1}".format(s, ", ".join([str(b) for b in badurl]))
+        t = out._issue("4.1-2", listfile+": URL field must be an "+
+                       "absolute URI or PID")
+        comm = _lines_comment(badurl)
         out._err(t, len(badurl) == 0, comm)
 
-        t = out._issue("4.1-3", "group-members.txt must list current bag name")
-        out._err(t, foundme)
+        t = out._issue("4.1-3", listfile+" must list current bag name")
+        out._err(t, bagname in found)
 
-        t = out._issue("4.1-4", "group-members.txt: Head bag must be "+
+        t = out._issue("4.1-4", listfile+": Head bag must be "+
                        "listed last")
-        out._err(t, last == self.bag._name)
+        out._err(t, last == bagname)
 
-        t = out._issue("4.1-5", "group-members.txt: a bag name should only be "+
+        t = out._issue("4.1-5", listfile+": a bag name should only be "+
                        "listed once")
-        comm = None
-        if len(replicated) > 0:
-            s = (len(replicated) > 1 and "s") or ""
-            if len(replicated) > 4:
-                replicated[3] = '...'
-                replicated = replicated[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in replicated]))
+        comm = _lines_comment(replicated)
         out._warn(t, len(replicated) == 0, comm)
 
         return out
 
-    def _validate_member_bags_03(self, mdir, out, want=ALL):
-
-        mbemf = "/".join([mdir, "member-bags.tsv"])
-        t = out._issue("4.0-1", "Multibag tag directory must contain a "+
-                       "member-bags.tsv file")
-        out._err(t, self.bag.isfile(mbemf))
-        if t.failed():
-            return out
-
+    def _parse_member_list(self, mbemf, sep, maxfields=None):
+        # read the member bag listing in a single pass, returning the tuple,
+        # (badfmt, badurl, replicated, found, last), where the first three 
+        # are lists of the numbers of offending lines, found maps each listed
+        # bag name to the line it first appears on, and last is the last name
         badfmt = []
         badurl = []
         replicated = []
-        found = set()
-        foundme = False
+        found = {}
         last = None
         with self.bag.open_text_file(mbemf) as fd:
-            i = 0
-            for line in fd:
-                i += 1
-                if not line.strip():
+            for i, line in enumerate(fd, 1):
+                line = line.strip()
+                if not line:
                     continue
-                parts = [f.strip() for f in line.strip().split('\t')]
-                last = parts[0]
-                if last == self.bag._name:
-                    foundme = True
-                if last in found:
+                # (only the first two fields are examined)
+                parts = line.split(sep, 2)
+                last = parts[0].strip()
+                if found.setdefault(last, i) != i:
                     replicated.append(i)
-                else:
-                    found.add(last)
-                if len(parts) > 1 and len(parts[1]) > 0:
-                    url = urlparse(parts[1])
-                    if not url.scheme or url.netloc:
-                        badurl.append(i)
-
-        t = out._issue("4.1-1", "member-bags.tsv lines must match "+
-                       "format, BAGNAME[\tURL][\t...]")
-        comm = None
-        if badfmt:
-            s = (len(badfmt) > 1 and "s") or ""
-            if len(badfmt) > 4:
-                badfmt[3] = '...'
-                badfmt = badfmt[:4]
-            comm = "line{0} {1}".format(s, ", ".join([str(b) for b in badfmt]))
-        out._err(t, len(badfmt) == 0, comm)
-
-        t = out._issue("4.1-2", "member-bags.tsv: URL field must be an "+
-                       "absolute URL")
-        comm = None
-        if badurl:
-            s = (len(badurl) > 1 and "s") or ""
-            if len(badurl) > 4:
-                badurl[3] = '...'
-                badurl = badurl[:4]
-            comm = "line{0} {1}".format(s, ", ".join([str(b) for b in badurl]))
-        out._err(t, len(badurl) == 0, comm)
-
-        t = out._issue("4.1-3", "member-bags.tsv must list current bag name")
-        out._err(t, foundme)
-
-        t = out._issue("4.1-4", "member-bags.tsv: Head bag must be "+
-                       "listed last")
-        out._err(t, last == self.bag._name)
-
-        t = out._issue("4.1-5", "member-bags.tsv: a bag name should only be "+
-                       "listed once")
-        comm = None
-        if len(replicated) > 0:
-            s = (len(replicated) > 1 and "s") or ""
-            if len(replicated) > 4:
-                replicated[3] = '...'
-                replicated = replicated[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in replicated]))
-        out._warn(t, len(replicated) == 0, comm)
+                url = len(parts) > 1 and parts[1].strip()
+                if url and not _absurire.match(url):
+                    badurl.append(i)
+                if maxfields and len(parts) > maxfields:
+                    badfmt.append(i)
 
-        return out
+        return badfmt, badurl, replicated, found, last
 
     def validate_file_lookup(self, want=ALL, results=None, version=CURRENT_VERSION):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
 
-        ishead = self.bag.is_head_multibag()
-        mdir = self.bag.info.get("Multibag-Tag-Directory")
+        mdir = self._head_tag_directory(out)
         if not mdir:
-            mdir = "multibag"
-        if not isinstance(mdir, list):
-            mdir = [mdir]
-        mdir = mdir[-1]
-        
-        assert mdir
-        assert ishead
-
-        t = out._issue("3-Tag-Directory",
-                       "Multibag-Tag-Directory must exist as directory")
-        out._err(t, self.bag.isdir(mdir))
-        if t.failed():
             return out
 
         if version == "0.2":
@@ -482,195 +473,122 @@ class HeadBagValidator(Validator):
         return out
 
     def _validate_group_directory(self, mdir, out, want=ALL):
-        flirf = "/".join([mdir, "group-directory.txt"])
+        return self._validate_lookup_list(mdir, "group-directory.txt", None,
+                                          "FILEPATH BAGNAME", out, want)
+
+    def _validate_file_lookup_03(self, mdir, out, want=ALL):
+        return self._validate_lookup_list(mdir, "file-lookup.tsv", '\t',
+                                          "FILEPATH\\tBAGNAME", out, want)
+
+    def _validate_lookup_list(self, mdir, listfile, sep, fmt, out, want=ALL):
+        # test the file that maps files to member bags (file-lookup.tsv or,
+        # in version 0.2, group-directory.txt) whose lines have fields 
+        # separated by sep (or whitespace, if None).
+        flirf = mdir + "/" + listfile
         t = out._issue("4.0-2", "Multibag tag directory must contain a "+
-                       "group-directory.txt file")
+                       listfile+" file")
         out._err(t, self.bag.isfile(flirf))
         if t.failed():
             return out
 
-        badfmt = []
-        replicated = []
-        missing = []
-        paths = set()
-        with self.bag.open_text_file(flirf) as fd:
-            i = 0
-            for line in fd:
-                i += 1
-                if not line.strip():
-                    continue
-                parts = [f.strip() for f in line.split()]
-                if parts[0] in paths:
-                    replicated.append(i)
-                else:
-                    paths.add(parts[0])
-                if len(parts) != 2:
-                    badfmt.append(i)
-
-                if len(parts) > 1 and parts[1] == self.bag._name and \
-                   not self.bag.isfile(parts[0]):
-                    missing.append(i)
+        badfmt, replicated, missing, paths = \
+            self._parse_lookup_list(flirf, sep)
 
-        t = out._issue("4.2-1", "group-directory.txt lines must match format, "+
-                       "FILEPATH BAGNAME")
-        comm = None
-        if len(badfmt) > 0:
-            s = (len(badfmt) > 1 and "s") or ""
-            if len(badfmt) > 4:
-                badfmt[3] = '...'
-                badfmt = badfmt[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in badfmt]))
+        t = out._issue("4.2-1", listfile+" lines must match format, "+fmt)
+        comm = _lines_comment(badfmt)
         out._err(t, len(badfmt) == 0, comm)
 
-        t = out._issue("4.2-2", "group-directory.txt: file path for current "+
+        t = out._issue("4.2-2", listfile+": file path for current "+
                        "bag must exist as a file")
-        comm = None
-        if len(missing) > 0:
-            s = (len(missing) > 1 and "s") or ""
-            if len(missing) > 4:
-                missing[3] = '...'
-                missing = missing[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in missing]))
+        comm = _lines_comment(missing)
         out._err(t, len(missing) == 0, comm)
 
-        t = out._issue("4.2-3", "group-directory.txt: a file path must be "+
+        t = out._issue("4.2-3", listfile+": a file path must be "+
                        "listed only once")
-        comm = None
-        if len(replicated) > 0:
-            s = (len(replicated) > 1 and "s") or ""
-            if len(replicated) > 4:
-                replicated[3] = '...'
-                replicated = replicated[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in replicated]))
+        comm = _lines_comment(replicated)
         out._warn(t, len(replicated) == 0, comm)
         
+        if not (want & REC):
+            return out
+
         # get a list of the payload files
-        missing = []
-        datadir = self.bag._root.subfspath("data")
-        for df in datadir.fs.walk.files():
-            f = df.split('/')[-1]
-            if f.startswith(".") or f.startswith("_"):
-                continue
-            path = '/'.join(['data', df[1:]])
-            if path not in paths:
-                missing.append(path)
+        missing = [p for p in self._payload_files() if p not in paths]
         
         t = out._issue("4.2-4", "all payload file should "+
-                       "be listed in the group-directory.txt file")
+                       "be listed in the "+listfile+" file")
         comm = None
         if len(missing) > 0:
             s = (len(missing) > 1 and "s") or ""
-            comm = [ "{0} payload file{1} missing from group-directory.txt"
-                     .format(len(missing), s) ]
+            comm = [ "{0} payload file{1} missing from {2}"
+                     .format(len(missing), s, listfile) ]
             comm += missing
         out._rec(t, len(missing) == 0)
 
         return out
 
-    def _validate_file_lookup_03(self, mdir, out, want=ALL):
-        flirf = "/".join([mdir, "file-lookup.tsv"])
-        t = out._issue("4.0-2", "Multibag tag directory must contain a "+
-                       "file-lookup.tsv file")
-        out._err(t, self.bag.isfile(flirf))
-        if t.failed():
-            return out
-
+    def _payload_files(self):
+        # iterate through the bag-relative paths of the payload files, 
+        # skipping hidden ones (whose names start with one of _hidden)
+        datadir = self.bag._root.subfspath("data")
+        try:
+            sysdir = datadir.fs.getsyspath(u'/')
+        except NoSysPath:
+            # e.g. a serialized bag
+            for df in datadir.fs.walk.files():
+                if not df.rpartition('/')[2].startswith(_hidden):
+                    yield 'data' + df
+            return
+
+        # a bag directory on local disk:  os.walk() types entries via 
+        # os.scandir without stat-ing every file (following links, as 
+        # the fs walk does)
+        for base, dirs, files in os.walk(sysdir, followlinks=True):
+            reldir = _ossepre.sub('/', base[len(sysdir):].strip(os.sep))
+            prefix = reldir and 'data/'+reldir+'/' or 'data/'
+            for f in files:
+                if not f.startswith(_hidden):
+                    yield prefix + f
+
+    def _parse_lookup_list(self, flirf, sep):
+        # read the file lookup listing in a single pass, returning the tuple,
+        # (badfmt, replicated, missing, paths), where the first three are 
+        # lists of the numbers of offending lines and paths maps each listed
+        # file path to the line it first appears on
         badfmt = []
         replicated = []
         missing = []
-        paths = set()
+        paths = {}
+        bagname = self.bag._name
+        isfile = self.bag.isfile
         with self.bag.open_text_file(flirf) as fd:
-            i = 0
-            for line in fd:
-                i += 1
+            for i, line in enumerate(fd, 1):
                 if not line.strip():
                     continue
-                parts = [f.strip() for f in line.split('\t')]
-                if parts[0] in paths:
+                parts = [f.strip() for f in line.split(sep)]
+                if paths.setdefault(parts[0], i) != i:
                     replicated.append(i)
-                else:
-                    paths.add(parts[0])
                 if len(parts) != 2:
                     badfmt.append(i)
 
-                if len(parts) > 1 and parts[1] == self.bag._name and \
-                   not self.bag.isfile(parts[0]):
+                if len(parts) > 1 and parts[1] == bagname and \
+                   not isfile(parts[0]):
                     missing.append(i)
 
-        t = out._issue("4.2-1", "file-lookup.tsv lines must match format, "+
-                       "FILEPATH\\tBAGNAME")
-        comm = None
-        if len(badfmt) > 0:
-            s = (len(badfmt) > 1 and "s") or ""
-            if len(badfmt) > 4:
-                badfmt[3] = '...'
-                badfmt = badfmt[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in badfmt]))
-        out._err(t, len(badfmt) == 0, comm)
-
-        t = out._issue("4.2-2", "file-lookup.tsv: file path for current "+
-                       "bag must exist as a file")
-        comm = None
-        if len(missing) > 0:
-            s = (len(missing) > 1 and "s") or ""
-            if len(missing) > 4:
-                missing[3] = '...'
-                missing = missing[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in missing]))
-        out._err(t, len(missing) == 0, comm)
-
-        t = out._issue("4.2-3", "file-lookup.tsv: a file path must be "+
-                       "listed only once")
-        comm = None
-        if len(replicated) > 0:
-            s = (len(replicated) > 1 and "s") or ""
-            if len(replicated) > 4:
-                replicated[3] = '...'
-                replicated = replicated[:4]
-            comm= "line{0} {1}".format(s,", ".join([str(b) for b in replicated]))
-        out._warn(t, len(replicated) == 0, comm)
-        
-        # get a list of the payload files
-        missing = []
-        datadir = self.bag._root.subfspath("data")
-        for df in datadir.fs.walk.files():
-            f = df.split('/')[-1]
-            if f.startswith(".") or f.startswith("_"):
-                continue
-            path = '/'.join(['data', df[1:]])
-            if path not in paths:
-                missing.append(path)
-        
-        t = out._issue("4.2-4", "all payload file should "+
-                       "be listed in the file-lookup.tsv file")
-        comm = None
-        if len(missing) > 0:
-            s = (len(missing) > 1 and "s") or ""
-            comm = [ "{0} payload file{1} missing from file-lookup.tsv"
-                     .format(len(missing), s) ]
-            comm += missing
-        out._rec(t, len(missing) == 0)
-
-        return out
+        return badfmt, replicated, missing, paths
 
     def validate_aggregation_info(self, want=ALL, results=None,
                                   version=CURRENT_VERSION):
         out = results
         if not out:
             out = ValidationResults(str(self.bag), want, version)
+        if not (want & ERROR):
+            return out
 
-        ishead = self.bag.is_head_multibag()
-        mdir = self.bag.info.get("Multibag-Tag-Directory")
-        if not mdir:
-            mdir = "multibag"
-        if not isinstance(mdir, list):
-            mdir = [mdir]
-        mdir = mdir[-1]
-        
+        assert self.bag.is_head_multibag()
+        mdir = self._tag_directory()
         assert mdir
-        assert ishead
 
-        aginfo = "/".join([mdir, "aggregation-info.txt"])
+        aginfo = mdir + "/aggregation-info.txt"
         if version == "0.2" or version == "0.3" or not self.bag.exists(aginfo):
             return out
 
@@ -1,15 +1,13 @@
 """
 This module provides the validator implementation for validating member bags.
 """
-import re
-
 from .base import (Validator, ValidationIssue, ValidationResults, 
-                   ALL, ERROR, WARN, REC, PROB, CURRENT_VERSION)
+                   ALL, ERROR, WARN, REC, PROB, CURRENT_VERSION, _LazyBagMixin)
 from .bag import BagValidator
 from ..access.bagit import BagValidationError, BagError, open_bag
 import fs.osfs
 
-class MemberBagValidator(Validator):
+class MemberBagValidator(_LazyBagMixin, Validator):
     """
     A validator that tests whether a given Bag (serialized or otherwise) complies
     with the Multibag requirements for serving as a member bag of a multibag 
@@ -25,7 +23,7 @@ class MemberBagValidator(Validator):
         """
         super(MemberBagValidator, self).__init__(bagpath)
         self.bagpath = bagpath
-        self.bag = open_bag(bagpath)
+        self._bagvalidator = BagValidator(bagpath)
 
     def validate(self, want=PROB, results=None):
         """
@@ -47,7 +45,7 @@ class MemberBagValidator(Validator):
             out = ValidationResults(self.target, want)
 
         # validate against the base BagIt spec
-        BagValidator(self.bagpath).validate(want, out)
+        self._bagvalidator.validate(want, out)
 
         version = self.bag.info.get("Multibag-Version")
         if version and isinstance(version, list):
@@ -84,7 +82,7 @@ class MemberBagValidator(Validator):
 
         t = out._issue("2.1b-name-wsp",
                   "A name must not begin nor end with any whitespace characters")
-        out._err(t, not re.search(r'^\s+', name) and not re.search(r'\s+$', name))
+        out._err(t, name == name.strip())
 
         return out
 
@@ -96,18 +94,19 @@ class MemberBagValidator(Validator):
         if self.bag.is_head_multibag():
             # these tests don't apply
             return out
+        info = self.bag.info
 
         t = out._issue("2-Head-Deprecates",
                        "bag-info.txt: Multibag-Head-Deprecates element "+
                        "should only be set for Head Bags")
-        out._warn(t, "Multibag-Head-Deprecates" not in self.bag.info)
+        out._warn(t, "Multibag-Head-Deprecates" not in info)
 
         t = out._issue("2-Tag-Directory",
                        "bag-info.txt: Multibag-Tag-Directory element "+
                        "should only be set for Head Bags")
-        out._warn(t, "Multibag-Tag-Directory" not in self.bag.info)
+        out._warn(t, "Multibag-Tag-Directory" not in info)
 
-        mdir = self.bag.info.get("Multibag-Tag-Directory")
+        mdir = info.get("Multibag-Tag-Directory")
         if not mdir:
             mdir = "multibag"
         if not isinstance(mdir, list):
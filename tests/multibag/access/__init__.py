@@ -4,6 +4,8 @@ def additional_tests():
     from . import (test_bagit_imported, test_bagit_fs, 
                    test_extended, test_multibag)
 
-    suites = [TestLoader().loadTestsFromModule(m[1])
-                     for m in globals().items() if m[0].startswith("test_")]
+    loader = TestLoader()
+    suites = [loader.loadTestsFromModule(m) for m in
+              (test_bagit_imported, test_bagit_fs,
+               test_extended, test_multibag)]
     return TestSuite(suites)
@@ -182,6 +182,51 @@ class TestExtendedReadWritableBag(test.TestCase):
         finally:
             shutil.rmtree(tempdir)
 
+    def test_walk_all(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            self.bagdir = os.path.join(tempdir, "samplebag")
+            shutil.copytree(os.path.join(datadir, "samplembag"), self.bagdir)
+            os.mkdir(os.path.join(self.bagdir, "metadata", "trial3"))
+
+            self.bag = xtend.as_extended(Bag(self.bagdir))
+
+            contents = self.bag.walk_all()
+            files = dict((p, sz) for p, sz, isdir in contents if not isdir)
+            self.assertIn("bagit.txt", files)
+            self.assertIn("data/trial3/trial3a.json", files)
+            self.assertEqual(files["data/trial1.json"],
+                             self.bag.sizeof("data/trial1.json"))
+            self.assertEqual([p for p, sz, isdir in contents if isdir],
+                             ["metadata/trial3"])
+
+            # each call reflects the bag's current contents
+            os.rmdir(os.path.join(self.bagdir, "metadata", "trial3"))
+            contents = self.bag.walk_all()
+            self.assertEqual([p for p, sz, isdir in contents if isdir], [])
+            self.assertEqual(len(contents), len(files))
+            os.remove(os.path.join(self.bagdir, "about.txt"))
+            self.assertNotIn("about.txt", list(self.bag.nonstandard()))
+
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_open_bin_file(self):
+        with self.bag.open_bin_file("bagit.txt") as fd:
+            content = fd.read()
+        self.assertTrue(isinstance(content, bytes))
+        self.assertTrue(content.startswith(b"BagIt-Version: "))
+
+    @test.skipIf(not hasattr(os, 'fwalk') or not xtend._scandir,
+                 "os.fwalk or os.scandir not available")
+    def test_local_contents(self):
+        for breadth in (False, True):
+            fwalked = list(xtend._fwalk_contents(self.bagdir, breadth))
+            scanned = list(xtend._scandir_contents(self.bagdir, breadth))
+            self.assertEqual(fwalked, scanned)
+        self.assertEqual(fwalked,
+                    list(xtend.as_extended(ReadOnlyBag(self.bagdir)).walk_all()))
+
     def test_replicate(self):
         self.bag.replicate_with_hardlink = False
         tempdir = tempfile.mkdtemp()
@@ -430,6 +475,16 @@ class TestExtendReadOnlyBag(test.TestCase):
         self.assertIn(os.path.join("multibag","file-lookup.tsv"), contents)
         self.assertEqual(len(contents), 13)
 
+    def test_walk_all(self):
+        contents = self.bag.walk_all()
+        self.assertEqual(self.bag.walk_all(), contents)
+        files = dict((p, sz) for p, sz, isdir in contents if not isdir)
+        self.assertIn("bagit.txt", files)
+        self.assertIn("data/trial3/trial3a.json", files)
+        self.assertEqual(files["data/trial1.json"],
+                         self.bag.sizeof("data/trial1.json"))
+        self.assertEqual([p for p, sz, isdir in contents if isdir], [])
+
     def test_replicate(self):
         tempdir = tempfile.mkdtemp()
         try:
@@ -442,6 +497,12 @@ class TestExtendReadOnlyBag(test.TestCase):
 
         finally:
             shutil.rmtree(tempdir)
+
+    def test_open_bin_file(self):
+        with self.bag.open_bin_file("bagit.txt") as fd:
+            content = fd.read()
+        self.assertTrue(isinstance(content, bytes))
+        self.assertTrue(content.startswith(b"BagIt-Version: "))
     
 
 
@@ -3,10 +3,9 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
-import os, pdb, logging, io
+import os, pdb, logging, io, codecs
 import tempfile, shutil
 import unittest as test
-from functools import cmp_to_key
 
 import multibag.split as split
 from multibag.access.bagit import Bag, ReadOnlyBag, Path, open_bag
@@ -89,6 +88,41 @@ class TestSplitPlan(test.TestCase):
         self.assertEqual(self.plan.find_destination("data/trial2.json")['name'],
                          "goob_2.bag")
         self.assertIsNone(self.plan.find_destination("goober.txt"))
+
+        # the last manifest listing a path wins
+        manifest = {
+           'contents': ["about.txt"],
+           'name': "goob_3.bag"
+        }
+        self.plan._manifests.append(manifest)
+        self.assertEqual(self.plan.find_destination("about.txt")['name'],
+                         "goob_3.bag")
+        manifest['contents'].append("goober.txt")
+        self.plan._manifests_changed()
+        self.assertEqual(self.plan.find_destination("goober.txt")['name'],
+                         "goob_3.bag")
+
+        # edits to a manifest's contents are seen once the plan is told
+        manifest['contents'] = ["metadata/trial3"]
+        self.assertEqual(self.plan.find_destination("goober.txt")['name'],
+                         "goob_3.bag")
+        self.plan._manifests_changed()
+        self.assertIsNone(self.plan.find_destination("goober.txt"))
+        self.assertEqual(self.plan.find_destination("metadata/trial3")['name'],
+                         "goob_3.bag")
+        self.assertEqual(self.plan.find_destination("about.txt")['name'],
+                         "goob_1.bag")
+
+        # adding or removing manifests is seen without being told
+        index = self.plan._destination_index()
+        self.assertIs(self.plan._destination_index(), index)
+        self.plan._manifests.pop()
+        self.assertEqual(self.plan.find_destination("metadata/trial3")['name'],
+                         "goob_1.bag")
+        self.plan._manifests += [{'contents': ["goober.txt"], 'name': "g4"}]
+        self.assertEqual(self.plan.find_destination("goober.txt")['name'], "g4")
+        del self.plan._manifests[:]
+        self.assertIsNone(self.plan.find_destination("about.txt"))
         
 
     def test_missing(self):
@@ -119,6 +153,12 @@ class TestSplitPlan(test.TestCase):
         missing = set(self.plan.missing())
         self.assertEqual(len(missing), 0)
 
+        # files added to the source bag later are seen
+        with open(os.path.join(self.bagdir, "data", "goober.json"), 'w') as fd:
+            fd.write("{}\n")
+        self.assertEqual(list(self.plan.missing()), ["data/goober.json"])
+        self.assertFalse(self.plan.is_complete())
+
     def test_complete_plan(self):
         willmiss = "data/trial1.json data/trial2.json data/trial3/trial3a.json"
         willmiss = willmiss.split()
@@ -178,6 +218,16 @@ class TestSplitPlan(test.TestCase):
         self.assertEqual(self.plan._manifests[0]['name'], "mbag_3")
         self.assertEqual(self.plan._manifests[1]['name'], "mbag_2")
 
+        # a short iterator leaves the names unchanged
+        with self.assertRaises(RuntimeError) as cm:
+            self.plan.name_output_bags(iter(["short"]))
+        self.assertIn("(after short)", str(cm.exception))
+        self.assertEqual(self.plan._manifests[0]['name'], "mbag_3")
+        with self.assertRaises(RuntimeError) as cm:
+            self.plan.name_output_bags(iter([]))
+        self.assertNotIn("after", str(cm.exception))
+        self.assertEqual(self.plan._manifests[1]['name'], "mbag_2")
+
     def test_apply_iter(self):
         manifest1 = {
            'contents': set("about.txt metadata/pod.json metadata/trial3".split()),
@@ -223,6 +273,113 @@ class TestSplitPlan(test.TestCase):
         self.assertTrue(bag.validate())
         self.assertTrue(bag.is_valid())
 
+        # the head bag gets a copy of the source bag-info.txt
+        with io.open(os.path.join(mbagdir,"multibag","aggregation-info.txt"),
+                     encoding='utf-8') as fd:
+            agginfo = fd.read()
+        with io.open(os.path.join(self.bagdir,"bag-info.txt"),
+                     encoding='utf-8') as fd:
+            self.assertEqual(agginfo, fd.read())
+        self.assertIn('ß', agginfo)
+
+    def test_copy_bag_info(self):
+        # line endings are normalized to LF, and a byte-order mark dropped
+        infofile = os.path.join(self.bagdir, "bag-info.txt")
+        with open(infofile, 'rb') as fd:
+            lines = fd.read().splitlines()
+        with open(infofile, 'wb') as fd:
+            fd.write(codecs.BOM_UTF8 + b"\r\n".join(lines) + b"\r\n")
+
+        destfile = os.path.join(self.tempdir, "aggregation-info.txt")
+        self.plan._copy_bag_info(destfile)
+        with open(destfile, 'rb') as fd:
+            content = fd.read()
+        self.assertNotIn(b"\r", content)
+        self.assertFalse(content.startswith(codecs.BOM_UTF8))
+        self.assertEqual(content, b"\n".join(lines) + b"\n")
+
+    def test_apply_zip(self):
+        # the handle on a serialized bag can't be shared between threads,
+        # so its output bags are written one at a time
+        class NoPool(object):
+            def __init__(self, *args, **kw):
+                raise AssertionError("thread pool used for a serialized bag")
+
+        self.plan = split.SplitPlan(open_bag(os.path.join(datadir,
+                                                          "samplembag.zip")))
+        self.plan._manifests.append({
+           'contents': ["about.txt", "metadata/pod.json"],
+           'name': "goob_1.bag"
+        })
+        self.plan._manifests.append({
+           'contents': ["data/trial1.json", "data/trial2.json"],
+           'name': "goob_2.bag"
+        })
+        self.plan._manifests.append({
+           'contents': ["data/trial3/trial3a.json"],
+           'name': "goob_3.bag"
+        })
+
+        pool = split.ThreadPoolExecutor
+        try:
+            split.ThreadPoolExecutor = NoPool
+            mbags = self.plan.apply(self.tempdir, max_workers=4)
+        finally:
+            split.ThreadPoolExecutor = pool
+
+        self.assertEqual(mbags, [os.path.join(self.tempdir, n) for n in
+                                 "goob_1.bag goob_2.bag goob_3.bag".split()])
+        for mbagdir, mf in zip(mbags, self.plan._manifests):
+            for member in mf['contents']:
+                self.assertTrue(os.path.exists(os.path.join(mbagdir, member)))
+            self.assertTrue(Bag(mbagdir).validate())
+
+    def test_apply(self):
+        self.plan._manifests.append({
+           'contents': ["about.txt", "metadata/pod.json", "metadata/trial3"],
+           'name': "goob_1.bag"
+        })
+        self.plan._manifests.append({
+           'contents': ["data/trial1.json", "data/trial2.json"],
+           'name': "goob_2.bag"
+        })
+        self.plan._manifests.append({
+           'contents': ["data/trial3/trial3a.json"],
+           'name': "goob_3.bag"
+        })
+
+        mbags = self.plan.apply(self.tempdir, max_workers=2)
+        self.assertEqual(mbags, [os.path.join(self.tempdir, n) for n in
+                                 "goob_1.bag goob_2.bag goob_3.bag".split()])
+        for mbagdir, mf in zip(mbags, self.plan._manifests):
+            for member in mf['contents']:
+                self.assertTrue(os.path.exists(os.path.join(mbagdir, member)))
+            bag = Bag(mbagdir)
+            self.assertTrue(bag.validate())
+
+        # files are replicated as hard links where possible
+        self.assertGreater(os.stat(os.path.join(mbags[1], "data",
+                                                "trial1.json")).st_nlink, 1)
+
+        mbagdir = mbags[-1]
+        with io.open(os.path.join(mbagdir,"multibag","member-bags.tsv"),
+                     encoding='utf-8') as fd:
+            self.assertEqual(fd.read().split(),
+                             "goob_1.bag goob_2.bag goob_3.bag".split())
+        with io.open(os.path.join(mbagdir,"multibag","file-lookup.tsv"),
+                     encoding='utf-8') as fd:
+            lookup = [l.split('\t') for l in fd.read().splitlines()]
+        self.assertEqual(lookup, [
+            ["about.txt", "goob_1.bag"],
+            ["metadata/pod.json", "goob_1.bag"],
+            ["data/trial1.json", "goob_2.bag"],
+            ["data/trial2.json", "goob_2.bag"],
+            ["data/trial3/trial3a.json", "goob_3.bag"]
+        ])
+        self.assertIn("Multibag-Head-Version", Bag(mbagdir).info)
+        self.assertNotIn("Multibag-Head-Version",
+                         Bag(mbags[0]).info)
+
     def test_apply_iter_nopass(self):
         manifest1 = {
            'contents': set("about.txt metadata/pod.json metadata/trial3".split()),
@@ -302,19 +459,29 @@ class TestNeighborlySplitter(test.TestCase):
         self.assertIn("/bagit.txt", specials)
         self.assertEqual(len(specials), 2)
 
-    def test_cmp_by_size(self):
+        self.assertTrue(self.spltr._is_special("/bag-info.txt"))
+        self.assertTrue(self.spltr._is_special("/manifest-sha256.txt"))
+        self.assertTrue(self.spltr._is_special("/tagmanifest-md5.txt"))
+        self.assertFalse(self.spltr._is_special("/data/bagit.txt"))
+        self.assertFalse(self.spltr._is_special("/data/manifest-md5.txt"))
+        self.assertFalse(self.spltr._is_special("/manifest.txt"))
+
+    def test_size_key(self):
         self.spltr = split.NeighborlySplitter()
-        self.info.sort(key=cmp_to_key(self.spltr._cmp_by_size))
+        self.info.sort(key=self.spltr._size_key)
         sz = 0
         for fi in reversed(self.info):
             self.assertGreaterEqual(fi['size'], sz)
             sz = fi['size']
+        self.assertEqual(self.info[0]['path'], "/b")
+        self.assertEqual([f['path'] for f in self.info[1:3]],
+                         ["/e/d/a", "/f/d/a"])
 
     def test_apply_algorithm(self):
         self.spltr = split.NeighborlySplitter(2200, 2000)
         self.info = [f for f in self.info
                        if not self.spltr._is_special(f['path'])]
-        self.info.sort(key=cmp_to_key(self.spltr._cmp_by_size))
+        self.info.sort(key=self.spltr._size_key)
         bag = ReadOnlyBag(self.bagdir)
         plan = split.SplitPlan(bag)
         self.spltr._apply_algorithm(self.info, plan)
@@ -357,6 +524,45 @@ class TestNeighborlySplitter(test.TestCase):
         self.assertEqual(len(mfs[2]['contents']), 3)
         self.assertEqual("samplembag_3.mbag",      mfs[2]['name'])
 
+        for mf in mfs:
+            self.assertEqual(len(mf['sizes']), len(mf['contents']))
+            self.assertEqual(sum(mf['sizes']), mf['totalsize'])
+            for f, sz in zip(mf['contents'], mf['sizes']):
+                self.assertEqual(sz, os.stat(os.path.join(self.bagdir,f)).st_size)
+
+    def test_sorted_files(self):
+        self.spltr = split.NeighborlySplitter(500)
+        bag = ReadOnlyBag(self.bagdir)
+        finfos = self.spltr._sorted_files(bag)
+        self.assertGreater(len(finfos), 0)
+        for f in finfos:
+            self.assertEqual(f['dir'], self.spltr._dirpath(f['path']))
+            self.assertEqual(f['dir'] + f['name'], f['path'])
+
+    def test_replan_changed(self):
+        self.spltr = split.NeighborlySplitter(2000)
+        self.tempdir = tempfile.mkdtemp()
+        try:
+            self.bagdir = os.path.join(self.tempdir, "samplebag")
+            shutil.copytree(os.path.join(datadir, "samplembag"), self.bagdir)
+            plan = self.spltr.plan(self.bagdir)
+            self.assertIsNotNone(plan.find_destination("data/trial3/trial3a.json"))
+
+            # changes below the bag's top directory are seen when planning again
+            os.remove(os.path.join(self.bagdir, "data", "trial3", "trial3a.json"))
+            with open(os.path.join(self.bagdir, "data", "trial1.json"), 'a') as fd:
+                fd.write(" " * 5000)
+            plan = self.spltr.plan(self.bagdir)
+            self.assertIsNone(plan.find_destination("data/trial3/trial3a.json"))
+            dest = plan.find_destination("data/trial1.json")
+            i = dest['contents'].index("data/trial1.json")
+            self.assertEqual(dest['sizes'][i],
+                os.stat(os.path.join(self.bagdir,"data","trial1.json")).st_size)
+            self.assertGreater(dest['totalsize'], 5000)
+
+        finally:
+            shutil.rmtree(self.tempdir)
+
     def test_split(self):
         from multibag.validate import HeadBagValidator, MemberBagValidator
         
@@ -431,7 +637,7 @@ class TestWellPackedSplitter(test.TestCase):
     def test_apply_algorithm(self):
         self.info = [f for f in self.info
                        if not self.spltr._is_special(f['path'])]
-        self.info.sort(key=cmp_to_key(self.spltr._cmp_by_size))
+        self.info.sort(key=self.spltr._size_key)
         bag = ReadOnlyBag(self.bagdir)
         plan = split.SplitPlan(bag)
         self.spltr._apply_algorithm(self.info, plan)
@@ -452,6 +658,40 @@ class TestWellPackedSplitter(test.TestCase):
             self.assertGreater(2500, plan._manifests[i]['totalsize'])
 
 
+    def test_walk_files(self):
+        bag = ReadOnlyBag(self.bagdir)
+        files = dict(self.spltr._walk_files(bag))
+        self.assertIn("/data/trial1.json", files)
+        self.assertIn("/data/trial3/trial3a.json", files)
+        self.assertIn("/bagit.txt", files)
+        self.assertNotIn("/data", files)
+        self.assertNotIn("/data/trial3", files)
+        self.assertEqual(files["/data/trial1.json"],
+                    os.stat(os.path.join(self.bagdir,"data","trial1.json")).st_size)
+
+        exp = dict((p, f.size) for p, f in
+                   bag._root.fs.walk.info(namespaces=['details'])
+                   if not f.is_dir)
+        self.assertEqual(files, exp)
+
+
+class TestPackSizes(test.TestCase):
+
+    def test_pack_sizes(self):
+        self.assertEqual(split._pack_sizes([], 100, 100), [])
+        self.assertEqual(split._pack_sizes([60, 50, 40, 10], 100, 100),
+                         [0, 1, 0, 1])
+        # target size closes a bag early
+        self.assertEqual(split._pack_sizes([60, 50, 40, 10], 100, 50),
+                         [0, 1, 1, 2])
+        # an oversized file goes in a bag by itself
+        self.assertEqual(split._pack_sizes([150, 60, 30, 0], 100, 100),
+                         [0, 1, 1, 1])
+        # unsorted input
+        self.assertEqual(split._pack_sizes([10, 60, 50, 40], 100, 100),
+                         [0, 0, 1, 1])
+
+
 class TestSimpleNamer(test.TestCase):
 
     def test_iter(self):
@@ -3,6 +3,7 @@ from unittest import TestLoader, TestSuite
 def additional_tests():
     from . import (test_mkdata)
 
-    suites = [TestLoader().loadTestsFromModule(m[1])
-                     for m in globals().items() if m[0].startswith("test_")]
+    loader = TestLoader()
+    suites = [loader.loadTestsFromModule(m) for m in
+              (test_mkdata,)]
     return TestSuite(suites)
@@ -28,6 +28,20 @@ class TestBagValidator(test.TestCase):
         self.assertTrue(valid8r.is_valid())
         valid8r.ensure_valid()
 
+        # results are named the same whether or not the bag was checked
+        self.assertEqual(valid8r.validate(val.ERROR).target, bagdir)
+        self.assertEqual(valid8r.validate(val.WARN|val.REC).target, bagdir)
+
+    def test_validate_nobag(self):
+        valid8r = bagv.BagValidator(os.path.join(datadir, "goober"))
+        with self.assertRaises(OSError):
+            valid8r.validate(val.ALL)
+
+        # the bag is not needed if errors are not wanted
+        results = valid8r.validate(val.WARN|val.REC)
+        self.assertEqual(results.count_applied(), 0)
+        self.assertIsNone(valid8r._bag)
+
     def test_validate_zip(self):
         bagdir = os.path.join(datadir, "samplembag.zip")
         valid8r = bagv.BagValidator(bagdir)
@@ -60,6 +74,109 @@ class TestBagValidator(test.TestCase):
         finally:
             shutil.rmtree(tempdir)
 
+    def test_cache(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            bagdir = os.path.join(tempdir, "samplebag")
+            shutil.copytree(os.path.join(datadir, "samplembag"), bagdir)
+            bagv.clear_cache()
+            valid8r = bagv.BagValidator(bagdir, use_cache=True)
+            self.assertTrue(valid8r.is_valid())
+
+            # an unchanged bag is not checked again
+            calls = []
+            valid8r.bag.validate = lambda: calls.append(1)
+            self.assertTrue(valid8r.is_valid())
+            self.assertEqual(calls, [])
+            self.assertTrue(bagv.BagValidator(bagdir).is_valid())
+
+            # a bag reached via a link shares its outcome, if caching is used
+            linkdir = os.path.join(tempdir, "linkbag")
+            os.symlink(bagdir, linkdir)
+            valid8r = bagv.BagValidator(linkdir, use_cache=True)
+            valid8r.bag.validate = lambda: calls.append(1)
+            self.assertTrue(valid8r.is_valid())
+            self.assertEqual(calls, [])
+            valid8r = bagv.BagValidator(linkdir)
+            valid8r.bag.validate = lambda: calls.append(1)
+            self.assertTrue(valid8r.is_valid())
+            self.assertEqual(calls, [1])
+            self.assertEqual(len(bagv._cache), 1)
+
+            # a changed bag is
+            with open(os.path.join(bagdir, "data", "trial1.json"), 'a') as fd:
+                fd.write("\n")
+            valid8r = bagv.BagValidator(bagdir, use_cache=True)
+            self.assertTrue(not valid8r.is_valid())
+            results = valid8r.validate(val.ALL)
+            self.assertEqual(results.count_failed(), 1)
+            self.assertGreater(len(results.failed()[0].comments), 0)
+
+            bagv.clear_cache()
+            self.assertEqual(len(bagv._cache), 0)
+
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_no_cache(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            bagdir = os.path.join(tempdir, "samplebag")
+            shutil.copytree(os.path.join(datadir, "samplembag"), bagdir)
+            bagv.clear_cache()
+            self.assertTrue(bagv.BagValidator(bagdir).is_valid())
+            self.assertEqual(len(bagv._cache), 0)
+
+            # corruption that keeps a file's size and mtime is caught
+            path = os.path.join(bagdir, "data", "trial1.json")
+            st = os.stat(path)
+            with open(path, 'r+b') as fd:
+                fd.seek(2)
+                fd.write(b"XX")
+            os.utime(path, (st.st_atime, st.st_mtime))
+            self.assertFalse(bagv.BagValidator(bagdir).is_valid())
+
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_validate_many(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            bagdir = os.path.join(tempdir, "samplebag")
+            shutil.copytree(os.path.join(datadir, "samplembag"), bagdir)
+            badbag = os.path.join(tempdir, "badbag")
+            shutil.copytree(os.path.join(datadir, "samplembag"), badbag)
+            os.rename(os.path.join(badbag, "data"), os.path.join(badbag, "goob"))
+            zipbag = os.path.join(datadir, "samplembag.zip")
+            bagv.clear_cache()
+
+            for workers in (2, 1):
+                results = bagv.validate_many([bagdir, badbag, zipbag],
+                                             val.ALL, workers, True)
+                self.assertEqual([r.count_applied() for r in results], [1,1,1])
+                self.assertEqual([r.ok() for r in results], [True,False,True])
+                self.assertGreater(len(results[1].failed()[0].comments), 0)
+                self.assertEqual([r.target for r in results],
+                                 [bagdir, badbag, zipbag])
+                self.assertEqual(len(bagv._cache), 3)
+
+            # outcomes found by validate_many() are cached for BagValidator
+            valid8r = bagv.BagValidator(badbag, use_cache=True)
+            valid8r.bag.validate = lambda: None
+            self.assertFalse(valid8r.is_valid())
+
+            results = bagv.validate_many([bagdir, badbag], val.WARN)
+            self.assertEqual([r.count_applied() for r in results], [0, 0])
+
+            # without the cache, each bag is checked again
+            bagv.clear_cache()
+            results = bagv.validate_many([bagdir, badbag], val.ALL, 1)
+            self.assertEqual([r.ok() for r in results], [True, False])
+            self.assertEqual(len(bagv._cache), 0)
+
+        finally:
+            shutil.rmtree(tempdir)
+
 
 
         
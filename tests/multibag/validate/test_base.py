@@ -3,7 +3,7 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
-import os, pdb, json
+import os, sys, pdb, json
 import tempfile, shutil
 import unittest as test
 
@@ -64,6 +64,30 @@ class TestValidationIssue(test.TestCase):
         self.assertEqual(len(issue.comments), 2)
         self.assertEqual(issue.comments[0], "little")
         self.assertEqual(issue.comments[1], "green")
+        self.assertIs(issue.comments, issue.comments)
+        issue.add_comment("men")
+        self.assertEqual(issue.comments, ("little", "green", "men"))
+
+        issue = val.ValidationIssue("A1.1", comments=("little", "green"))
+        self.assertEqual(issue.comments, ("little", "green"))
+        issue = val.ValidationIssue("A1.1", comments="little")
+        self.assertEqual(issue.comments, ("little",))
+        issue = val.ValidationIssue("A1.1", comments=3)
+        self.assertEqual(issue.comments, ("3",))
+
+        with self.assertRaises(ValueError):
+            val.ValidationIssue("A1.1", val.ALL)
+        with self.assertRaises(ValueError):
+            issue.type = 0
+        self.assertEqual(issue.type, val.ERROR)
+
+    @test.skipIf(sys.version_info[0] < 3, "unicode strings are not interned")
+    def test_interned(self):
+        issue = val.ValidationIssue("".join(["A1", ".1"]),
+                                    spec=" ".join(["Life", "must", "grow"]))
+        self.assertIs(issue.label, val.ValidationIssue("A1.1").label)
+        self.assertIs(issue.specification,
+                 val.ValidationIssue("A1.1", spec="Life must grow").specification)
 
     def test_description(self):
         
@@ -89,6 +113,45 @@ class TestValidationIssue(test.TestCase):
         self.assertEqual(issue.description,
         "ERROR: multibag 3.1 A1.1: Life must self-replicate\n   Little\n   green")
 
+        # the text follows changes to the issue
+        issue.add_comment("men")
+        self.assertEqual(issue.description,
+  "ERROR: multibag 3.1 A1.1: Life must self-replicate\n   Little\n   green\n   men")
+        issue.type = val.WARN
+        issue.label = "A1.2"
+        self.assertEqual(issue.summary,
+                         "WARNING: multibag 3.1 A1.2: Life must self-replicate")
+        issue.specification = "Life must evolve"
+        issue.profile_version = "3.2"
+        self.assertEqual(str(issue),
+                         "WARNING: multibag 3.2 A1.2: Life must evolve (Little)")
+
+        res = val.ValidationResults("Life")
+        res._err(issue, True)
+        self.assertEqual(issue.summary,
+                         "PASSED: multibag 3.2 A1.2: Life must evolve")
+
+    def test_to_json_obj(self):
+        issue = val.ValidationIssue("A1.1", val.WARN, profver="3.1",
+                                    spec="Life must self-replicate", 
+                                    comments=["Little", "green"])
+        data = issue.to_json_obj()
+        self.assertEqual(list(data.keys()), ["type", "profile_name",
+                            "profile_version", "label", "spec", "comments"])
+        self.assertEqual(data['type'], "warning")
+        self.assertEqual(data['profile_name'], "multibag")
+        self.assertEqual(data['profile_version'], "3.1")
+        self.assertEqual(data['label'], "A1.1")
+        self.assertEqual(data['spec'], "Life must self-replicate")
+        self.assertEqual(data['comments'], ("Little", "green"))
+        json.dumps(data)
+
+        data['label'] = "goob"
+        self.assertEqual(issue.to_json_obj()['label'], "A1.1")
+        issue.add_comment("men")
+        self.assertEqual(issue.to_json_obj()['comments'],
+                         ("Little", "green", "men"))
+
 class TestValidationResults(test.TestCase):
 
     def setUp(self):
@@ -115,6 +178,9 @@ class TestValidationResults(test.TestCase):
         self.assertEqual(self.res.applied(val.WARN), "d e".split())
         self.assertEqual(self.res.applied(val.REC), "f".split())
         self.assertEqual(self.res.applied(val.PROB), "a b c d e".split())
+        self.assertEqual(list(self.res.iter_applied()), "a b c d e f".split())
+        self.assertEqual(list(self.res.iter_applied(val.WARN|val.REC)),
+                         "d e f".split())
 
         self.assertEqual(self.res.count_applied(), 6)
         self.assertEqual(self.res.count_applied(val.ALL), 6)
@@ -185,6 +251,32 @@ class TestValidationResults(test.TestCase):
         self.res.want = val.ALL
         self.assertFalse(self.res.ok())
 
+    def test_to_json_bytes(self):
+        self.assertEqual(json.loads(self.res.to_json_bytes().decode('utf-8')), [])
+
+        self.res._err(val.ValidationIssue("1", spec="Life must grow"), True)
+        self.res._rec(val.ValidationIssue("2"), False, "Needs sun")
+        data = json.loads(self.res.to_json_bytes().decode('utf-8'))
+        self.assertEqual([d['label'] for d in data], ["1", "2"])
+        self.assertEqual(data[0]['spec'], "Life must grow")
+        self.assertEqual(data[1]['type'], "recommendation")
+        self.assertEqual(data[1]['comments'], ["Needs sun"])
+
+        data = json.loads(self.res.to_json_bytes(val.REC).decode('utf-8'))
+        self.assertEqual([d['label'] for d in data], ["2"])
+
+        # the encoding is the same with or without orjson
+        self.res._warn(val.ValidationIssue("3"), False, "Größe")
+        encoded = self.res.to_json_bytes()
+        self.assertIn("Größe".encode('utf-8'), encoded)
+        self.assertNotIn(b", ", encoded)
+        fast = val.orjson
+        try:
+            val.orjson = None
+            self.assertEqual(self.res.to_json_bytes(), encoded)
+        finally:
+            val.orjson = fast
+
     def test_add_issue(self):
         self.assertEqual(self.res.count_applied(), 0)
 
@@ -200,7 +292,11 @@ class TestValidationResults(test.TestCase):
         self.assertEqual(self.res.count_applied(val.ERROR), 1)
         self.assertEqual(self.res.count_applied(val.WARN), 1)
 
-        self.res._rec(val.ValidationIssue("I must be polite"), True,"Aw!")
+        issue = val.ValidationIssue("I must be polite")
+        self.res._rec(issue, True,"Aw!")
+        self.assertIs(self.res.applied(val.REC)[0], issue)
+        self.assertEqual(issue.type, val.REC)
+        self.assertEqual(issue.comments, ("Aw!",))
         self.assertEqual(self.res.count_applied(), 3)
         self.assertEqual(self.res.count_passed(), 2)
         self.assertEqual(self.res.count_failed(), 1)
@@ -208,6 +304,38 @@ class TestValidationResults(test.TestCase):
         self.assertEqual(self.res.count_applied(val.WARN), 1)
         self.assertEqual(self.res.count_applied(val.REC), 1)
 
+    def test_merge(self):
+        self.res._err(val.ValidationIssue("a"), True)
+        other = val.ValidationResults("bag", val.ALL)
+        other._err(val.ValidationIssue("b"), False)
+        other._rec(val.ValidationIssue("c"), True)
+
+        self.res._merge(other)
+        self.assertEqual([i.label for i in self.res.applied()], ["a", "b", "c"])
+        self.assertEqual(self.res.count_failed(), 1)
+        self.assertEqual(len(other.applied()), 2)
+
+
+class TestMultibagValidationError(test.TestCase):
+
+    def test_str(self):
+        res = val.ValidationResults("Life")
+        res._err(val.ValidationIssue("1", spec="Life must grow"), False, "No")
+        self.assertEqual(str(val.MultibagValidationError(res)),
+                         "ERROR: multibag 0.4 1: Life must grow: No")
+
+        res._err(val.ValidationIssue("2", spec="Life must eat"), False, "No")
+        self.assertEqual(str(val.MultibagValidationError(res)),
+                         "2 validation errors detected:\n\n"
+                         " * ERROR: multibag 0.4 1: Life must grow\n   No\n\n"
+                         " * ERROR: multibag 0.4 2: Life must eat\n   No")
+
+        res._err(val.ValidationIssue("3"), False)
+        res._err(val.ValidationIssue("4"), False)
+        msg = str(val.MultibagValidationError(res))
+        self.assertTrue(msg.startswith("4 validation errors detected, including:"))
+        self.assertIn(" * ERROR: multibag 0.4 3", msg)
+        self.assertNotIn(" * ERROR: multibag 0.4 4", msg)
 
 class TestValidator(test.TestCase):
 
@@ -236,6 +364,25 @@ class TestValidator(test.TestCase):
     def test_ensure_valid(self):
         self.valid8r.ensure_valid()
 
+class TestLazyBagMixin(test.TestCase):
+
+    class BagTargetValidator(val._LazyBagMixin, val.Validator):
+        pass
+
+    def test_bag(self):
+        bagdir = os.path.join(datadir, "samplembag")
+        valid8r = self.BagTargetValidator(bagdir)
+        self.assertIsNone(valid8r._bag)
+        bag = valid8r.bag
+        self.assertIsNotNone(bag)
+        self.assertIs(valid8r.bag, bag)
+
+        valid8r = self.BagTargetValidator(os.path.join(datadir, "goober"))
+        self.assertEqual(valid8r.target, os.path.join(datadir, "goober"))
+        with self.assertRaises(OSError):
+            valid8r.bag
+        self.assertIsNone(valid8r._bag)
+
 
 
         
@@ -24,6 +24,26 @@ class TestHeadBagValidator(test.TestCase):
     def tearDown(self):
         shutil.rmtree(self.tempdir)
 
+    def test_lines_comment(self):
+        self.assertIsNone(bagv._lines_comment([]))
+        self.assertEqual(bagv._lines_comment([3]), "line 3")
+        self.assertEqual(bagv._lines_comment([1, 2, 3, 4]), "lines 1, 2, 3, 4")
+        linenos = [1, 2, 3, 4, 5]
+        self.assertEqual(bagv._lines_comment(linenos), "lines 1, 2, 3, ...")
+        self.assertEqual(linenos, [1, 2, 3, 4, 5])
+
+    def test_payload_files(self):
+        expected = ["data/trial1.json", "data/trial2.json",
+                    "data/trial3/trial3a.json"]
+        valid8r = bagv.HeadBagValidator(os.path.join(datadir,"samplembag.zip"))
+        self.assertEqual(sorted(valid8r._payload_files()), expected)
+
+        for f in [".goober", "_gurn", os.path.join("trial3", ".gary")]:
+            with open(os.path.join(self.bagdir, "data", f), 'w') as fd:
+                fd.write("x")
+        valid8r = bagv.HeadBagValidator(self.bagdir)
+        self.assertEqual(sorted(valid8r._payload_files()), expected)
+
     def test_validate_version(self):
         valid8r = bagv.HeadBagValidator(self.bagdir)
         results = valid8r.validate_version()
@@ -40,6 +60,17 @@ class TestHeadBagValidator(test.TestCase):
         self.assertEqual(results.count_applied(), 3)
         self.assertTrue(results.ok())
 
+        for url in ["goober", "/goober/gurn", "http:goober", "http:///goober",
+                    "//goober.com/gurn", "1http://goober.com/"]:
+            valid8r.bag.info['Multibag-Reference'] = url
+            results = valid8r.validate_reference()
+            self.assertEqual(results.count_failed(), 1, url)
+            self.assertEqual(results.failed()[0].label, "3-Reference-val")
+
+        valid8r.bag.info['Multibag-Reference'] = "s3+ssl://goober:99/gurn"
+        results = valid8r.validate_reference()
+        self.assertTrue(results.ok())
+
     def test_validate_tag_directory(self):
         valid8r = bagv.HeadBagValidator(self.bagdir)
         results = valid8r.validate_tag_directory()
@@ -124,6 +155,15 @@ class TestHeadBagValidator(test.TestCase):
         self.assertEqual(results.count_failed(), 1)
         self.assertEqual(results.failed()[0].label,"3-Head-Deprecates_notselfdep")
         self.assertTrue(not results.ok())
+
+        valid8r.bag.info['Multibag-Head-Deprecates'] = ["0.1, goober, gurn",
+                                                        " 0.2 ,  ", "1.0"]
+        results = valid8r.validate_head_deprecates()
+        self.assertEqual(results.count_applied(), 4)
+        self.assertEqual([i.label for i in results.failed()],
+                         ["3-Head-Deprecates_format",
+                          "3-Head-Deprecates_notselfdep"])
+        self.assertEqual(results.failed()[0].comments, ("0.1, goober, gurn",))
         
     def test_validate_baginfo_recs(self):
         valid8r = bagv.HeadBagValidator(self.bagdir)
@@ -152,12 +192,51 @@ class TestHeadBagValidator(test.TestCase):
         self.assertEqual(results.count_failed(), 1)
         self.assertTrue(not results.ok())
 
+        with open(os.path.join(self.bagdir,"multibag","member-bags.tsv"),"w") as fd:
+            fd.write("goober\thttps://example.com/bags/goober.zip\n")
+            fd.write("gurn\tgurn.zip\n")
+            fd.write("gary\tdoi:10.18434/T4SW26\n")
+            fd.write("samplembag\n")
+        results = valid8r.validate_member_bags()
+        self.assertEqual(results.count_applied(), 7)
+        self.assertEqual(results.count_failed(), 1)
+        self.assertEqual(results.failed()[0].label, "4.1-2")
+        self.assertEqual(results.failed()[0].comments, ("line 2",))
+
+        # a drive letter is not a scheme, and a scheme needs a body
+        with open(os.path.join(self.bagdir,"multibag","member-bags.tsv"),"w") as fd:
+            fd.write("goober\tC:\\bags\\goober.zip\n")
+            fd.write("gurn\tfoo:\n")
+            fd.write("gary\turn:nbn:de:1234\n")
+            fd.write("samplembag\n")
+        results = valid8r.validate_member_bags()
+        self.assertEqual(results.count_failed(), 1)
+        self.assertEqual(results.failed()[0].label, "4.1-2")
+        self.assertEqual(results.failed()[0].comments, ("lines 1, 2",))
+
+        with open(os.path.join(self.bagdir,"multibag","member-bags.tsv"),"w") as fd:
+            fd.write("goober\n")
+            fd.write("goober\n")
+            fd.write("gurn\n")
+            fd.write("goober\n")
+            fd.write("samplembag\n")
+        results = valid8r.validate_member_bags()
+        self.assertEqual(results.count_applied(), 7)
+        self.assertEqual(results.count_failed(), 1)
+        self.assertEqual(results.failed()[0].label, "4.1-5")
+        self.assertEqual(results.failed()[0].comments, ("lines 2, 4",))
+
     def test_validate_file_lookup(self):
         valid8r = bagv.HeadBagValidator(self.bagdir)
         results = valid8r.validate_file_lookup()
         self.assertEqual(results.count_applied(), 6)
         self.assertTrue(results.ok())
 
+        results = valid8r.validate_file_lookup(val.PROB)
+        self.assertEqual(results.count_applied(), 5)
+        results = valid8r.validate_tag_directory(val.WARN|val.REC)
+        self.assertEqual(results.count_applied(), 0)
+
         with open(os.path.join(self.bagdir,"multibag","file-lookup.tsv"),"a") as fd:
             fd.write("goober  \t  samplembag\n")
         valid8r = bagv.HeadBagValidator(self.bagdir)
@@ -250,10 +329,34 @@ class TestHeadBagValidator(test.TestCase):
         
     def test_validate(self):
         valid8r = bagv.HeadBagValidator(self.bagdir)
-        results = valid8r.validate()
+        results = valid8r.validate(val.ALL)
         self.assertEqual(results.count_applied(), 31)
         self.assertTrue(results.ok())
 
+        # the payload listing recommendation is skipped by default
+        results = valid8r.validate()
+        self.assertEqual(results.count_applied(), 30)
+        self.assertTrue(results.ok())
+        self.assertEqual(results.applied()[0].label, "2-Bag")
+        self.assertEqual(results.applied()[1].label, "3-Version")
+
+        # issues are added after any already in the given results
+        results = val.ValidationResults("samplembag", val.ALL)
+        results._err(val.ValidationIssue("0-Goober"), True)
+        self.assertIs(valid8r.validate(val.ALL, results), results)
+        self.assertEqual(results.applied()[0].label, "0-Goober")
+        self.assertEqual(results.applied()[1].label, "2-Bag")
+        self.assertIsNone(valid8r._isdir_cache)
+
+        # tag directory checks are not cached across validations
+        os.rename(os.path.join(self.bagdir, "multibag"),
+                  os.path.join(self.bagdir, "goober"))
+        results = valid8r.validate()
+        self.assertTrue(not results.ok())
+        self.assertEqual([i.label for i in results.failed()
+                                  if i.label == "3-Tag-Directory"],
+                         3 * ["3-Tag-Directory"])
+
     def test_is_valid(self):
         valid8r = bagv.HeadBagValidator(self.bagdir)
         self.assertTrue(valid8r.is_valid())
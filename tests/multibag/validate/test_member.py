@@ -24,7 +24,6 @@ class TestMemberBagValidator(test.TestCase):
     def tearDown(self):
         shutil.rmtree(self.tempdir)
 
-
     def test_validate_bagname(self):
         valid8r = bagv.MemberBagValidator(self.bagdir)
         results = valid8r.validate_bagname()